@@ -1,5 +1,7 @@
 # Dialog Manager
 import os
+from worldcache import world_cache
+from worldpack import read_lines
 
 ASSETS_DIR = os.path.dirname(os.path.abspath(__file__))
 def res_path(relative_path):
@@ -12,28 +14,44 @@ class DialogFile:
     def __init__(self,name):
         self.name = name
         self.dialoglines = []
-        filename = os.path.join('data','dialog',name)
+        filename = DialogFile.data_file(name)
         self.load(filename)
+
+    # Name of the data file that holds a set of dialog lines
+    @staticmethod
+    def data_file(name):
+        return os.path.join('data','dialog',name)
         
     
     def load(self,filename):
         try:            
-            lines = open(res_path(filename),'r')
-            for line in lines:
-                if not line.startswith('#') and not line=='\n':  # Ignore comments and empty lines
-                    if line.find('=') == -1:
-                        self.dialoglines.append(line.strip())                    
-                    else:
-                        key,value=line.split('=')
-                        phrases = value.strip().split(',')                    
-                        setattr(self,key.strip(),phrases)
+            fields = world_cache.read(filename,res_path(filename),DialogFile.read_fields)
+            self.dialoglines += fields.pop('dialoglines')
+            for key, value in fields.items():
+                setattr(self,key,value)
         except:
             print(f'File read error: {filename} does not exist')     
 
-    def get_line(self):
+    # Parse the lines of a dialog file into a dictionary of fields
+    @staticmethod
+    def read_fields(lines):
+        fields = {'dialoglines':[]}
+        for line in lines:
+            if not line.startswith('#') and not line=='\n':  # Ignore comments and empty lines
+                if line.find('=') == -1:
+                    fields['dialoglines'].append(line.strip())                    
+                else:
+                    key,value=line.split('=')
+                    phrases = value.strip().split(',')                    
+                    fields[key.strip()] = phrases
+        return fields
+
+    def get_line(self,rng=None):
         import random            
+        if rng == None:
+            rng = random
         if len(self.dialoglines)>0:
-            index=random.randint(0,len(self.dialoglines))-1
+            index=rng.randint(0,len(self.dialoglines))-1
             return self.dialoglines[index]
         else:
             return None        
@@ -48,7 +66,7 @@ class DialogManager:
     
     def load(self,filename):
         try:
-            lines = open(res_path(filename),'r')
+            lines = read_lines(filename,res_path(filename))
             for line in lines:
                 if not line.startswith('#') and not line=='\n':  # Ignore comments and empty lines
                     key, value = line.split('=')             
@@ -56,8 +74,8 @@ class DialogManager:
                     self.dialogs[key]=dlglist              
         except:
             print(f'File read error: {filename} does not exist')            
-    def get_line(self,dlg):
+    def get_line(self,dlg,rng=None):
         if dlg in self.dialogs.keys():
-            return self.dialogs[dlg].get_line()
+            return self.dialogs[dlg].get_line(rng)
         else:
-            return self.dialogs['default'].get_line()
+            return self.dialogs['default'].get_line(rng)
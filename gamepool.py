@@ -0,0 +1,269 @@
+# Game Pool
+#
+# Runs the game server's games either in the server process (LocalGames) or
+# spread across a pool of worker processes (GamePool), so that command
+# handling isn't limited to one CPU. Both have the same async methods, and
+# every game is identified by its session id. A session stays on the worker
+# that started its game. If a worker dies, the games it was running are lost
+# (the server starts those players over) and a new worker takes its place.
+# The templates for the whole world are built before the workers are forked,
+# so every worker shares them with the server instead of reading data/ again.
+import gc
+import os
+import stat
+import signal
+import asyncio
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+import pyadventure as pyadv
+
+# Raised when a session's game no longer exists (its worker died)
+class GameLost(Exception):
+    pass
+
+# Carry out one request on a dictionary of games (session id -> Console)
+def run_request(games,op,session,text=''):
+    match op:
+        case 'start':
+            game = games.get(session)
+            if game == None:
+                game = pyadv.new_game()
+                games[session] = game
+            return game.player.current_room.describe()
+        case 'handle':
+            if not session in games:
+                raise GameLost(f'no game for session {session}')
+            return games[session].handle(text)
+        case 'line':
+            if not session in games:
+                raise GameLost(f'no game for session {session}')
+            return games[session].handle_line(text)
+        case 'reset':
+            if session in games:
+                games[session].reset_game_environment()
+        case 'end':
+            game = games.pop(session,None)
+            if not game == None:
+                game.finish()
+    return None
+
+# Games played in the server process itself
+class LocalGames:
+    def __init__(self):
+        self.games = {}
+
+    async def start(self,session):
+        return run_request(self.games,'start',session)
+
+    async def handle(self,session,text):
+        return run_request(self.games,'handle',session,text)
+
+    async def handle_line(self,session,text):
+        return run_request(self.games,'line',session,text)
+
+    async def reset(self,session):
+        return run_request(self.games,'reset',session)
+
+    async def end(self,session):
+        return run_request(self.games,'end',session)
+
+    async def close(self):
+        for game in self.games.values():
+            game.finish()
+        self.games.clear()
+
+# Close every socket a forked worker inherited from the server except its own pipe. A worker started
+# to replace one that died would otherwise keep the players' connections open after the server closes them.
+def close_sockets(keep):
+    for folder in ['/proc/self/fd','/dev/fd']:
+        if os.path.isdir(folder):
+            fds = [int(fd) for fd in os.listdir(folder)]
+            break
+    else:
+        return
+    for fd in fds:
+        if fd > 2 and not fd == keep:
+            try:
+                if stat.S_ISSOCK(os.fstat(fd).st_mode):
+                    os.close(fd)
+            except OSError:
+                pass
+
+# The loop each worker process runs: read (request id, op, session, text) from the pipe and send back
+# (request id, True, result) or (request id, False, error message). None means stop.
+def worker_main(conn):
+    signal.signal(signal.SIGINT,signal.SIG_IGN)     # the server decides when the workers stop
+    signal.set_wakeup_fd(-1)
+    close_sockets(conn.fileno())
+    games = {}
+    while True:
+        try:
+            request = conn.recv()
+        except (EOFError,OSError):
+            return
+        if request == None:
+            for game in games.values():
+                game.finish()
+            return
+        request_id, op, session, text = request
+        try:
+            conn.send((request_id,True,run_request(games,op,session,text)))
+        except GameLost as e:
+            conn.send((request_id,False,str(e)))
+        except Exception as e:
+            conn.send((request_id,False,f'{type(e).__name__}: {e}'))
+
+class Worker:
+    def __init__(self,slot,process,conn):
+        self.slot = slot
+        self.process = process
+        self.conn = conn
+        self.sessions = set()       # sessions whose games this worker is running
+        self.pending = {}           # request id -> future waiting for the answer
+        self.alive = True
+        # Writing to the pipe blocks once it is full (the worker is busy), so requests are sent from
+        # a thread of the worker's own, never from the event loop. One thread keeps them in order.
+        self.sender = ThreadPoolExecutor(1)
+
+# Games spread across worker processes (forked, so it needs a platform that can fork)
+class GamePool:
+    def __init__(self,workers):
+        # Build every template now, then freeze them out of the garbage collector so
+        # the forked workers don't touch (and copy) the pages they live on
+        pyadv.build_templates()
+        gc.collect()
+        gc.freeze()
+        self.context = multiprocessing.get_context('fork')
+        self.loop = None
+        self.workers = [self.spawn(slot) for slot in range(workers)]
+        self.affinity = {}          # session id -> Worker
+        self.next_request = 0
+        self.respawns = 0
+        self.reaping = set()        # tasks waiting for dead workers to exit
+
+    # Check if worker processes can be used on this platform
+    @staticmethod
+    def supported():
+        return 'fork' in multiprocessing.get_all_start_methods()
+
+    # Start a worker process for a slot in the pool
+    def spawn(self,slot):
+        conn, child_conn = self.context.Pipe()
+        process = self.context.Process(target=worker_main,args=(child_conn,),daemon=True)
+        process.start()
+        child_conn.close()
+        worker = Worker(slot,process,conn)
+        if not self.loop == None:
+            self.loop.add_reader(conn.fileno(),self.read,worker)
+        return worker
+
+    # Start listening for answers from the workers (on the running event loop)
+    async def attach(self):
+        self.loop = asyncio.get_running_loop()
+        for worker in self.workers:
+            self.loop.add_reader(worker.conn.fileno(),self.read,worker)
+
+    # Pass on every answer a worker has sent back
+    def read(self,worker):
+        try:
+            while worker.alive and worker.conn.poll():
+                request_id, ok, value = worker.conn.recv()
+                future = worker.pending.pop(request_id,None)
+                if future == None or future.done():
+                    continue
+                if ok:
+                    future.set_result(value)
+                else:
+                    future.set_exception(GameLost(value) if value.startswith('no game') else RuntimeError(value))
+        except (EOFError,OSError):
+            self.lost(worker)
+
+    # A worker died: fail everything it was doing, forget its games, and start a new worker in its place.
+    # Called on the event loop, so the old process is waited for by a separate task.
+    def lost(self,worker):
+        if not worker.alive:
+            return
+        worker.alive = False
+        self.loop.remove_reader(worker.conn.fileno())
+        worker.conn.close()
+        worker.sender.shutdown(wait=False)
+        for future in worker.pending.values():
+            if not future.done():
+                future.set_exception(GameLost(f'worker {worker.slot} stopped'))
+        worker.pending.clear()
+        for session in worker.sessions:
+            self.affinity.pop(session,None)
+        self.workers[worker.slot] = self.spawn(worker.slot)
+        self.respawns += 1
+        task = self.loop.create_task(self.reap(worker))
+        self.reaping.add(task)
+        task.add_done_callback(self.reaping.discard)
+
+    # Wait (off the event loop) for a dead worker's process to exit, killing it if it hangs
+    async def reap(self,worker):
+        await self.loop.run_in_executor(None,worker.process.join,5)
+        if worker.process.is_alive():
+            worker.process.kill()
+            await self.loop.run_in_executor(None,worker.process.join)
+        print(f'Game pool: worker {worker.slot} stopped (exit code {worker.process.exitcode}), {len(worker.sessions)} games lost')
+
+    # Send a message to a worker from its sender thread
+    async def send(self,worker,message):
+        try:
+            await self.loop.run_in_executor(worker.sender,worker.conn.send,message)
+        except (OSError,ValueError,RuntimeError):
+            self.lost(worker)
+
+    # Send a request to the worker running a session's game. New games go to the worker with the fewest.
+    async def request(self,op,session,text=''):
+        worker = self.affinity.get(session)
+        if worker == None:
+            if op == 'end':
+                return None
+            if not op == 'start':
+                raise GameLost(f'no game for session {session}')
+            worker = min([worker for worker in self.workers if worker.alive],key=lambda worker: len(worker.sessions))
+            self.affinity[session] = worker
+            worker.sessions.add(session)
+        self.next_request += 1
+        future = self.loop.create_future()
+        worker.pending[self.next_request] = future
+        await self.send(worker,(self.next_request,op,session,text))
+        result = await future
+        if op == 'end':
+            worker.sessions.discard(session)
+            self.affinity.pop(session,None)
+        return result
+
+    async def start(self,session):
+        return await self.request('start',session)
+
+    async def handle(self,session,text):
+        return await self.request('handle',session,text)
+
+    async def handle_line(self,session,text):
+        return await self.request('line',session,text)
+
+    async def reset(self,session):
+        return await self.request('reset',session)
+
+    async def end(self,session):
+        return await self.request('end',session)
+
+    # Stop every worker (they finish the request they're working on first)
+    async def close(self):
+        for worker in self.workers:
+            if worker.alive:
+                worker.alive = False
+                self.loop.remove_reader(worker.conn.fileno())
+                try:
+                    await self.loop.run_in_executor(worker.sender,worker.conn.send,None)
+                except (OSError,ValueError,RuntimeError):
+                    pass
+                worker.sender.shutdown(wait=False)
+        for worker in self.workers:
+            await self.loop.run_in_executor(None,worker.process.join,5)
+            if worker.process.is_alive():
+                worker.process.terminate()
+        if len(self.reaping)>0:
+            await asyncio.gather(*self.reaping)
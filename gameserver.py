@@ -0,0 +1,247 @@
+# Game Server
+#
+# Hosts the game for many players at once over a plain telnet-style line
+# protocol (any telnet or netcat client can connect). Every connection gets
+# its own game, which is only built once the player presses Enter, so idle
+# connections cost next to nothing. All the connections are served by one
+# asyncio event loop. The markers the pygame front end turns into colours
+# (<< room names >>, [[ warnings, ** and [CRIT]) are sent as ANSI styles.
+# On Ctrl+C (or SIGTERM) the server stops taking new players, warns everyone
+# who is still playing, and gives them server_drain_timeout seconds to finish.
+# With server_workers set, the games run in that many worker processes (see
+# gamepool.py) and this process only handles the connections.
+#
+#   python gameserver.py [port]     - settings are read from the '# Game Server' section of config.txt
+import sys
+import signal
+import asyncio
+import pyadventure as pyadv
+from gamepool import LocalGames, GamePool, GameLost
+
+# Styles for lines that start with one of the display markers: (marker, ANSI code, markers to strip)
+STYLES = [
+    ('<<','\x1b[1;33m',['<<','>>']),      # room names (gold)
+    ('[[','\x1b[31m',['[[']),             # warnings (red)
+    ('**','\x1b[35m',['**']),             # purple
+    ('[CRIT]','\x1b[1;35m',['[CRIT]']),   # critical hits (bold purple)
+    ('[READ]','\x1b[33m',['[READ]']),     # things that are read (gold)
+]
+ANSI_RESET = '\x1b[0m'
+
+# Style one line of output (or just strip its marker if ansi is off)
+def style_line(line,ansi=True):
+    for marker, code, strip in STYLES:
+        if line.startswith(marker):
+            for text in strip:
+                line = line.replace(text,'')
+            return code+line+ANSI_RESET if ansi else line
+    return line
+
+# Turn a block of game output into lines for the network
+def format_output(output,ansi=True):
+    lines = [style_line(line,ansi) for line in output.split('\n')]
+    return '\r\n'.join(lines)+'\r\n'
+
+# Drop telnet negotiation (IAC sequences) from a line and decode it
+def clean_line(data):
+    text = bytearray()
+    i = 0
+    while i < len(data):
+        byte = data[i]
+        if byte == 255 and i+1 < len(data):
+            if data[i+1] == 255:            # an escaped 255
+                text.append(255)
+                i += 2
+            elif 251 <= data[i+1] <= 254:   # WILL/WONT/DO/DONT plus an option
+                i += 3
+            else:
+                i += 2
+        else:
+            text.append(byte)
+            i += 1
+    return text.decode('utf-8','replace').strip()
+
+class Session:
+    def __init__(self,server,reader,writer,id):
+        self.server = server
+        self.reader = reader
+        self.writer = writer
+        self.id = id                # the player's game is looked up by this in server.games
+        self.address = writer.get_extra_info('peername')
+        self.state = 'start'        # 'start', 'game', or 'over' (waiting to hear if they want to play again)
+
+    async def send(self,text):
+        self.writer.write(text.encode('utf-8'))
+        await self.writer.drain()
+
+    async def prompt(self):
+        await self.send('> ')
+
+    # Show the start screen text
+    async def welcome(self):
+        config = self.server.config
+        lines = config.start_screen_text.split('|')
+        await self.send(format_output('<<'+lines[0]+'>>\n'+'\n'.join(lines[1:]),self.server.ansi))
+        await self.send('\r\nPress Enter to begin.\r\n')
+
+    # Show the end credits and ask about playing again
+    async def game_over(self):
+        credits = self.server.config.end_credits_text.replace('|','\n')
+        await self.send(format_output('\n'+credits,self.server.ansi))
+        await self.send('\r\nPlay again? (y/n) ')
+
+    # Deal with one line typed by the player. Returns False when the connection should close.
+    async def handle_line(self,text):
+        games = self.server.games
+        match self.state:
+            case 'start':
+                self.state = 'game'
+                await self.send(format_output(await games.start(self.id),self.server.ansi))
+            case 'game':
+                if len(text) == 0:
+                    await self.prompt()
+                    return True
+                try:
+                    results = await games.handle_line(self.id,text)
+                except GameLost:
+                    self.state = 'start'
+                    await self.send('\r\nSomething went wrong and your game was lost. Press Enter to start again.\r\n')
+                    return True
+                self.server.commands += len(results)
+                status = results[-1].status
+                if status == 'quit':
+                    credits = self.server.config.end_credits_text.replace('|','\n')
+                    await self.send(format_output(credits,self.server.ansi))
+                    return False
+                # A chain of commands (n; take sword; e) is sent back all at once, each after its own prompt
+                if len(results) == 1:
+                    output = results[0].text()
+                else:
+                    output = pyadv.transcript(results).lstrip('\n')
+                await self.send(format_output(output,self.server.ansi))
+                if status in ['died','end']:
+                    self.state = 'over'
+                    await self.game_over()
+                    return True
+            case 'over':
+                if not text.lower().startswith('y'):
+                    return False
+                await games.reset(self.id)
+                self.state = 'start'
+                await self.send('\r\nPress Enter to begin.\r\n')
+                return True
+        await self.prompt()
+        return True
+
+    # Read and handle lines until the player leaves, goes quiet for too long, or the server shuts down
+    async def run(self):
+        await self.welcome()
+        while True:
+            try:
+                data = await asyncio.wait_for(self.reader.readline(),self.server.idle_timeout)
+            except asyncio.TimeoutError:
+                await self.send('\r\nDisconnected for being idle too long.\r\n')
+                return
+            except (ValueError,asyncio.LimitOverrunError):
+                await self.send('\r\nThat line is too long.\r\n')
+                return
+            if len(data) == 0:
+                return
+            if not await self.handle_line(clean_line(data)):
+                return
+
+class GameServer:
+    def __init__(self,host=None,port=None):
+        self.config = pyadv.load_config()   # the settings in config.txt (every player gets their own game)
+        self.host = getattr(self.config,'server_host','127.0.0.1') if host == None else host
+        self.port = getattr(self.config,'server_port',4000) if port == None else port
+        self.max_connections = getattr(self.config,'server_max_connections',2000)
+        self.idle_timeout = getattr(self.config,'server_idle_timeout',900)
+        self.drain_timeout = getattr(self.config,'server_drain_timeout',10)
+        self.max_line = getattr(self.config,'server_max_line',512)
+        self.ansi = getattr(self.config,'server_ansi','true') == 'true'
+        workers = getattr(self.config,'server_workers',0)
+        if workers>0 and GamePool.supported():
+            self.games = GamePool(workers)
+        else:
+            self.games = LocalGames()
+        self.sessions = {}          # Session -> task serving it
+        self.server = None
+        self.draining = False
+        self.stopped = None
+        self.connections = 0
+        self.commands = 0
+
+    # Serve one connection from start to finish
+    async def serve(self,reader,writer):
+        if self.draining or len(self.sessions) >= self.max_connections:
+            try:
+                writer.write(b'The temple is full right now. Please try again later.\r\n')
+                await writer.drain()
+            except ConnectionError:
+                pass
+            writer.close()
+            return
+        self.connections += 1
+        session = Session(self,reader,writer,self.connections)
+        self.sessions[session] = asyncio.current_task()
+        try:
+            await session.run()
+        except (ConnectionError,asyncio.CancelledError):
+            pass
+        finally:
+            del self.sessions[session]
+            writer.close()
+            try:
+                await self.games.end(session.id)
+            except (GameLost,asyncio.CancelledError):
+                pass
+
+    async def start(self):
+        self.stopped = asyncio.Event()
+        if isinstance(self.games,GamePool):
+            await self.games.attach()
+            print(f'Running games in {len(self.games.workers)} worker processes')
+        self.server = await asyncio.start_server(self.serve,self.host,self.port,limit=self.max_line)
+        print(f'Game server listening on {self.host}:{self.port} (up to {self.max_connections} players)')
+
+    # Stop taking new players, warn everyone still playing, and give them drain_timeout seconds to finish
+    async def shutdown(self):
+        if self.draining:
+            return
+        self.draining = True
+        self.server.close()
+        print(f'Shutting down: waiting for {len(self.sessions)} players to finish')
+        for session in list(self.sessions):
+            try:
+                session.writer.write(f'\r\nThe server is shutting down in {self.drain_timeout} seconds.\r\n'.encode('utf-8'))
+            except ConnectionError:
+                pass
+        tasks = list(self.sessions.values())
+        if len(tasks)>0:
+            done, pending = await asyncio.wait(tasks,timeout=self.drain_timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending,return_exceptions=True)
+        await self.server.wait_closed()
+        await self.games.close()
+        print(f'Served {self.connections} connections and {self.commands} commands')
+        self.stopped.set()
+
+    # Run until Ctrl+C or SIGTERM, then drain
+    async def run(self):
+        await self.start()
+        loop = asyncio.get_running_loop()
+        for sig in [signal.SIGINT,signal.SIGTERM]:
+            try:
+                loop.add_signal_handler(sig,lambda: asyncio.ensure_future(self.shutdown()))
+            except (NotImplementedError,AttributeError):
+                pass        # no signal handlers on this platform (Ctrl+C raises KeyboardInterrupt instead)
+        await self.stopped.wait()
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv)>1 else None
+    try:
+        asyncio.run(GameServer(port=port).run())
+    except KeyboardInterrupt:
+        pass
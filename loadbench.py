@@ -0,0 +1,139 @@
+# Load Benchmark
+#
+# Generates a large random world in a temporary folder and reports how long it
+# takes to load with the serial loader and with the parallel loader (thread and
+# process pools).
+#
+#   python loadbench.py [num_rooms] [workers]
+import os
+import sys
+import time
+import random
+import shutil
+import tempfile
+import dialog
+import worldpack
+import pyadventure as pyadv
+
+ITEM_KINDS = ['item','item','item','container','lockbox','weapon','pile','door']
+
+# Write a data file of key=value lines
+def write_file(path,fields):
+    with open(path,'w') as f:
+        for key, value in fields:
+            f.write(key+'='+value+'\n')
+
+# Generate a world with the given number of rooms (plus 3 items per room and a monster every 4 rooms)
+def generate_world(root,num_rooms):
+    for folder in ['items','rooms','monsters','dialog']:
+        os.makedirs(os.path.join(root,'data',folder))
+    words = ['dusty','ancient','glowing','cracked','silent','damp','gilded','crooked','hollow','sunken']
+
+    items = []
+    for i in range(num_rooms*3):
+        name = 'item_'+str(i)
+        kind = random.choice(ITEM_KINDS)
+        items.append(name+'|'+kind)
+        write_file(os.path.join(root,'data','items',name+'.txt'),[
+            ('name',random.choice(words)+' '+name),
+            ('kind',kind),
+            ('attributes','plural,'+random.choice(words)),
+            ('describe_text',' '.join(random.choices(words,k=30))),
+            ('contents','item_'+str(random.randrange(num_rooms*3))),
+            ('to_hit',str(random.randint(0,5))),
+            ('damage',str(random.randint(1,8))),
+            ('invoke_effect','add to_hit 1;set in_use True'),
+            ('smell_text',' '.join(random.choices(words,k=5)))])
+
+    monsters = []
+    for i in range(num_rooms//4):
+        name = 'monster_'+str(i)
+        monsters.append(name)
+        write_file(os.path.join(root,'data','monsters',name+'.txt'),[
+            ('name',name),
+            ('describe_text',' '.join(random.choices(words,k=30))),
+            ('attributes','blocker'),
+            ('AC',str(random.randint(8,16))),
+            ('HP',str(random.randint(5,40))),
+            ('to_hit',str(random.randint(0,5))),
+            ('damage',str(random.randint(1,8))),
+            ('block_direction','north'),
+            ('item','item_'+str(i))])
+
+    rooms = []
+    for i in range(num_rooms):
+        name = 'room_'+str(i)
+        rooms.append(name)
+        fields = [
+            ('id',name),
+            ('name',random.choice(words).capitalize()+' Room'),
+            ('long_description',' '.join(random.choices(words,k=60))),
+            ('short_description',' '.join(random.choices(words,k=20))),
+            ('map','north:room_'+str((i+1)%num_rooms)+',south:room_'+str((i-1)%num_rooms)),
+            ('items',','.join('item_'+str(i*3+j) for j in range(3))),
+            ('solution','say '+random.choice(words)),
+            ('solved_script','add_key map east room_0;print msg_solved'),
+            ('msg_solved',' '.join(random.choices(words,k=15))),
+            ('hint',' '.join(random.choices(words,k=10)))]
+        if i%4 == 0 and i//4 < len(monsters):
+            fields.append(('npcs','monster_'+str(i//4)))
+        write_file(os.path.join(root,'data','rooms',name+'.txt'),fields)
+
+    dialogs = []
+    for name in ['default','echoes','sounds']:
+        dialogs.append(name+'='+name+'.txt')
+        with open(os.path.join(root,'data','dialog',name+'.txt'),'w') as f:
+            for i in range(20):
+                f.write(' '.join(random.choices(words,k=8))+'\n')
+
+    for filename, lines in [('items.txt',items),('rooms.txt',rooms),('monsters.txt',monsters),('dialog.txt',dialogs)]:
+        with open(os.path.join(root,'data',filename),'w') as f:
+            f.write('\n'.join(lines)+'\n')
+
+# Load the whole world once and return the time it took in seconds. Every run starts cold: the
+# parsed files, the templates, the compiled scripts, and the keyword indexes are all thrown away
+# (inside the timed part, since a real launch starts without them too).
+def time_load(loader,workers=4,pool='thread'):
+    pyadv.world_cache.entries = {}
+    start = time.perf_counter()
+    pyadv.templates.clear()
+    pyadv.compiled_scripts.clear()
+    pyadv.keyword_indexes.clear()
+    if loader == 'parallel':
+        pyadv.preload_world(workers,pool)
+    registries = [pyadv.load_itemlist(),pyadv.load_dungeon(),pyadv.load_monsterlist()]
+    pyadv.load_dialog()
+    for registry in registries:
+        registry.prefetch(registry)
+    return time.perf_counter()-start
+
+if __name__ == "__main__":
+    sizes = [int(sys.argv[1])] if len(sys.argv)>1 else [250,1000,4000]
+    workers = int(sys.argv[2]) if len(sys.argv)>2 else 4
+    saved_entries = pyadv.world_cache.entries
+    saved_dirs = (pyadv.ASSETS_DIR,dialog.ASSETS_DIR)
+    # A packed world.pak would serve the real game's files in place of the generated ones
+    saved_archive = worldpack.world_archive
+    worldpack.world_archive = None
+    random.seed(599)
+
+    print(f'Loading generated worlds with {workers} workers on {os.cpu_count()} CPUs')
+    print(f'{"rooms":>7} {"files":>7} {"serial":>9} {"threads":>9} {"processes":>10}')
+    for size in sizes:
+        root = tempfile.mkdtemp()
+        try:
+            generate_world(root,size)
+            pyadv.ASSETS_DIR = dialog.ASSETS_DIR = root
+            num_files = len(pyadv.world_files())
+            serial = time_load('serial')
+            threads = time_load('parallel',workers,'thread')
+            processes = time_load('parallel',workers,'process')
+            print(f'{size:>7} {num_files:>7} {serial:>8.3f}s {threads:>8.3f}s {processes:>9.3f}s')
+        finally:
+            pyadv.ASSETS_DIR, dialog.ASSETS_DIR = saved_dirs
+            shutil.rmtree(root)
+
+    # Don't let the generated worlds end up in the real world cache
+    worldpack.world_archive = saved_archive
+    pyadv.world_cache.entries = saved_entries
+    pyadv.world_cache.changed = False
@@ -20,7 +20,7 @@ from utility import *
 import pyadventure as pyadv
 
 def unused(stdscr):
-    game = pyadv.game
+    game = pyadv.new_game()
     output = game.title
     output_log = pyadv.MessageBuffer()
 
@@ -38,25 +38,16 @@ def unused(stdscr):
 
     # Handle return/enter (send command)
     elif key == "\n":
-        match text:
-            case 'e': text = 'east'
-            case 'w': text = 'west'
-            case 's': text = 'south'
-            case 'n': text = 'north'
-            case 'u': text = 'up'
-            case 'd': text = 'down'
-            case 'inv': text = 'inventory'
-
-        output = game.handle(text)                             
+        results = game.handle_line(text)
+        status = results[-1].status
                                         
-        if output == 'quit' or '[END]' in output:
+        if status in ['quit','end']:
             game_state = 'game_over'                                       
         
-        if output.startswith('[DIED]'):
-            output = output.replace('[DIED]','')
+        if status == 'died':
             game_state = 'player_death'                            
 
-        output_log.read('\n>> '+text+"\n"+output)
+        output_log.read(pyadv.transcript(results))
         text = ''
     
     if not key == None:
@@ -70,7 +61,7 @@ def main(stdscr):
     stdscr.nodelay(True)
     x,y = 0,0 
     game_state = 'start_menu'
-    game = pyadv.game
+    game = pyadv.new_game()
 
     output = game.title
     output_log = pyadv.MessageBuffer()
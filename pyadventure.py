@@ -9,8 +9,18 @@
 # Main Game Code
 from utility import *
 from dialog import*
+from worldcache import world_cache, parse_file, register_parser, get_fingerprint
+from worldwatch import Watcher
+from worldpack import read_lines
+from collections import deque, OrderedDict
+from collections.abc import MutableMapping
+from types import MappingProxyType
 import os
 import re
+import time
+import random
+import itertools
+import threading
 
 ASSETS_DIR = os.path.dirname(os.path.abspath(__file__))
 
@@ -20,6 +30,436 @@ def resource_path(relative_path):
         return os.path.join(sys._MEIPASS,os.path.join(ASSETS_DIR,relative_path))
     return os.path.join(ASSETS_DIR, relative_path)
 
+# ===========================================================================================
+# ENTITY - Common base for rooms, items, and monsters. What's in an object's data file (plus
+#          the defaults its constructor sets up) is kept once in a shared, read-only template.
+#          The object itself only holds the fields that have changed during play (its overlay);
+#          everything else is looked up in the template.
+# ===========================================================================================
+class Template:
+    def __init__(self,cls,name,fields):
+        self.cls = cls
+        self.name = name
+        self.fields = MappingProxyType(fields)
+        self.replaced_by = None     # newer template built after the data file was edited
+        # Fields named like a class attribute (e.g. a method) would be hidden by it, so they always live in the overlay
+        self.shadowed = [key for key in fields if hasattr(cls,key)]
+
+        # Compile the object's scripts (and index its descriptions) now, so they're ready to use and
+        # any mistakes show up at load time
+        self.errors = []
+        for key, value in fields.items():
+            if is_script_field(key) and isinstance(value,str):
+                for error in compile_script(value).errors:
+                    self.errors.append(f'{name} {key}: {error}')
+            elif key.endswith('_description') and isinstance(value,str):
+                keyword_index(value)
+
+    def report(self):
+        for error in self.errors:
+            print(f'Script error: {error}')
+
+# Templates shared by every game, keyed by (class name, object name)
+templates = {}
+templates_lock = threading.Lock()
+template_generation = 0         # goes up every time templates are rebuilt by reload_templates
+reload_errors = {}              # data file -> fingerprint of the version that failed to reload
+
+# Get the template for an object, building it from its data file the first time
+# (and printing any script errors, unless the caller is going to report them itself)
+def get_template(cls,name,report=True):
+    key = (cls.__name__,name)
+    template = templates.get(key)
+    if template is None:
+        with templates_lock:
+            template = templates.get(key)
+            if template is None:
+                template = Template(cls,name,vars(cls(name)))
+                templates[key] = template
+                if report:
+                    template.report()
+    return template
+
+# Rebuild the template of every object whose data file has been edited since it was loaded.
+# Only objects that have been loaded are checked, so this never costs a load of the whole world.
+def reload_templates():
+    global template_generation
+    rebuilt = 0
+    for key, template in list(templates.items()):
+        cls, name = template.cls, template.name
+        filename = cls.data_file(name)
+        path = resource_path(filename)
+        try:
+            if not world_cache.is_stale(filename,path):
+                continue
+            fingerprint = get_fingerprint(filename,path)
+        except OSError:
+            continue                # deleted or being saved, so leave the old template alone
+        if reload_errors.get(filename) == fingerprint:
+            continue
+        # Parse the file before building anything so a half-finished edit can't wipe out the object
+        try:
+            world_cache.read(filename,path,cls.read_fields)
+        except Exception:
+            print(f'Reload error: {filename} could not be read')
+            reload_errors[filename] = fingerprint
+            continue
+        reload_errors.pop(filename,None)
+        new_template = Template(cls,name,vars(cls(name)))
+        new_template.report()
+        with templates_lock:
+            templates[key] = new_template
+        template.replaced_by = new_template
+        rebuilt += 1
+    if rebuilt>0:
+        world_cache.save()
+        template_generation += 1
+    return rebuilt
+
+# Background watcher that calls reload_templates (started by the first game with hot_reload=true)
+world_watcher = None
+
+def start_watcher():
+    global world_watcher
+    if world_watcher is None:
+        world_watcher = Watcher(reload_templates)
+    world_watcher.start()
+
+class Entity:
+    game = None                     # the Console (game session) the object belongs to
+
+    # Build an object for a game that shares the template for name instead of loading its own copy
+    @classmethod
+    def from_template(cls,name,game=None):
+        obj = cls.__new__(cls)
+        state = vars(obj)
+        state['template'] = get_template(cls,name)
+        state['game'] = game
+        obj.clear_overlay()
+        return obj
+
+    # Every change to an object in a game moves the game's state version on (see Console.memoized)
+    def __setattr__(self,key,value):
+        state = self.__dict__
+        state[key] = value
+        game = state.get('game')
+        if not game == None:
+            game.state_version += 1
+
+    # Fields that haven't been changed are read from the template. Lists and dicts are copied
+    # into the overlay first, since whoever asked for them may be about to change them.
+    def __getattr__(self,key):
+        template = self.__dict__.get('template')
+        if template is None or not key in template.fields:
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{key}'")
+        value = template.fields[key]
+        if isinstance(value,(list,dict)):
+            value = value.copy()
+            self.__dict__[key] = value
+        return value
+
+    # Check if the object has a field, whether it has been changed or is still in the template
+    def has_field(self,key):
+        state = self.__dict__
+        if key in state:
+            return True
+        template = state.get('template')
+        return template is not None and key in template.fields
+
+    # Other objects whose fields this object's scripts can change, in the order they're searched
+    def script_scope(self):
+        return [self.game.player,self.game.player.current_room]
+
+    # Find the object a script field belongs to: this object first, then its script scope (None if nothing has it)
+    def field_owner(self,key):
+        if self.has_field(key):
+            return self
+        for obj in self.script_scope():
+            if obj.has_field(key):
+                return obj
+        return None
+
+    # Object script handler - runs a short string of commands (see SCRIPTS) on this object
+    def parse(self,cmdscript):
+        return self.run_script(compile_script(cmdscript))
+
+    # Run a compiled script, returning its output (or None if it didn't print anything)
+    def run_script(self,script):
+        buffer = MessageBuffer()
+        for handler, code in script.ops:
+            handler(self,code,buffer)
+        if len(buffer.log)>0:
+            return buffer.send()
+        return None
+
+    # Random numbers come from the object's game, so that every game can be seeded on its own
+    def rng(self):
+        return random if self.game is None else self.game.rng
+
+    # Throw away every change made since the object was built
+    def clear_overlay(self):
+        state = vars(self)
+        template = state['template']
+        game = state.get('game')
+        state.clear()
+        state['template'] = template
+        if not game == None:
+            state['game'] = game
+        for key in template.shadowed:
+            value = template.fields[key]
+            state[key] = value.copy() if isinstance(value,(list,dict)) else value
+
+    # Switch to a newer template, keeping the changes made during play. Fields that were only
+    # copied over from the old template (and never changed) are dropped so the new values show through.
+    def switch_template(self,template):
+        state = vars(self)
+        old = state['template']
+        for key in list(state):
+            if key in old.fields and state[key] == old.fields[key]:
+                del state[key]
+        state['template'] = template
+        for key in template.shadowed:
+            if not key in state:
+                value = template.fields[key]
+                state[key] = value.copy() if isinstance(value,(list,dict)) else value
+
+    # Reset back to the starting values (objects without a template re-read their data file)
+    def reset(self):
+        if 'template' in vars(self):
+            self.clear_overlay()
+        else:
+            self.__init__(self.id)
+
+# ==========================================================================================
+# SCRIPTS - Object scripts (like 'add HP 2;set in_use True;run here solved_script') are
+#           compiled once into a list of instructions. Each instruction is a tuple that starts
+#           with its opcode, with numbers already converted and explicit targets resolved:
+#             ('set', key, 'field'|'int'|'str', value)      ('toggle', key, value or None)
+#             ('add'|'boost', key, amount)                  ('sub', 'auto'|'player'|'room', key, amount)
+#             ('append'|'remove', key, values)              ('add_key', field, key, value)
+#             ('open', item or None)   ('print', key)       ('run', 'room' or object name, field)
+#             ('unknown', command)     ('bad', line)
+#           Rooms, items, and monsters all run scripts on the same interpreter: each opcode has
+#           one handler in SCRIPT_OPS, looked up when the script is compiled.
+# ==========================================================================================
+class Script:
+    def __init__(self,text):
+        self.text = text
+        self.code = []
+        self.errors = []            # problems found while compiling
+        for line in text.split(';'):
+            line = line.strip()
+            if len(line)==0:
+                continue
+            try:
+                code = compile_line(line.split(' '))
+                if code[0] == 'unknown' and not code[1] == '':
+                    self.errors.append(f"unknown command '{code[1]}'")
+            except (IndexError,ValueError):
+                code = ('bad',line)
+                self.errors.append(f"bad arguments in '{line}'")
+            self.code.append(code)
+        self.ops = [(SCRIPT_OPS[code[0]],code) for code in self.code]     # (handler, instruction) pairs to run
+
+# Compile one line of a script (already split into words) into an instruction
+def compile_line(args):
+    cmd = args.pop(0)
+    match cmd:
+        case 'set':
+            if args[1] == 'to':
+                return ('set',args[0],'field',args[2])
+            elif len(args)>2:
+                raise ValueError('set takes a single value')
+            elif args[1].isdigit():
+                return ('set',args[0],'int',int(args[1]))
+            return ('set',args[0],'str',args[1])
+        case 'toggle':
+            return ('toggle',args[0],int(args[1]) if len(args)>1 else None)
+        case 'add'|'boost':
+            return (cmd,args[0],int(args[1]))
+        case 'sub':
+            if args[0] == 'game.player':
+                return ('sub','player',args[1],int(args[2]))
+            elif args[0] == 'here':
+                return ('sub','room',args[1],int(args[2]))
+            return ('sub','auto',args[0],int(args[1]))
+        case 'append':
+            return ('append',args[0],tuple(args[1:]))
+        case 'remove':
+            args[1]
+            return ('remove',args[0],tuple(args[1:]))
+        case 'add_key':
+            return ('add_key',args[0],args[1],''.join(args[2:]))
+        case 'open':
+            if len(args)>1:
+                raise ValueError('too many arguments for open')
+            return ('open',args[0] if len(args)>0 else None)
+        case 'print':
+            return ('print',args[0])
+        case 'run':
+            if len(args)<2:
+                raise ValueError('run needs an object and a field')
+            if args[0] in ['current_room','here']:
+                return ('run','room',args[1])
+            return ('run',args[0],args[1])
+        case _:
+            return ('unknown',cmd)
+
+# Compiled scripts, keyed by their text (so each script is only compiled once)
+compiled_scripts = {}
+
+def compile_script(text):
+    script = compiled_scripts.get(text)
+    if script is None:
+        script = Script(text)
+        compiled_scripts[text] = script
+    return script
+
+# Check if a data file field holds a script
+def is_script_field(key):
+    return key.endswith('_script') or key.endswith('_effect') or key.startswith('on_take_') or key == 'hidden'
+
+# Find the object named in a 'run' instruction (in the given game)
+def find_script_object(game,name):
+    if name == 'room':
+        return game.player.current_room
+    for registry in [game.monsters,game.dungeon_rooms,game.dungeon_items]:
+        if name in registry:
+            return registry[name]
+    return None
+
+# Opcode handlers. Each one gets the object running the script, the instruction, and the buffer for any output.
+# Fields are looked up with obj.field_owner, so each kind of object decides which fields its scripts can reach.
+
+# set a field to an integer, string, or the contents of another field
+def op_set(obj,code,buffer):
+    op, key, mode, value = code
+    if mode == 'field':
+        value = getattr(obj,value)
+    setattr(obj,key,value)
+
+# flip a True/False field
+def op_toggle(obj,code,buffer):
+    op, key, value = code
+    owner = obj.field_owner(key)
+    if not owner == None:
+        owner.toggle(key)
+    elif not value == None:
+        setattr(obj,key,value)
+
+# increment a field by a given amount
+def op_add(obj,code,buffer):
+    op, key, amount = code
+    owner = obj.field_owner(key)
+    if not owner == None:
+        setattr(owner,key,getattr(owner,key) + amount)
+    else:
+        setattr(obj,key,amount)
+
+# decrement a field by a given amount
+def op_sub(obj,code,buffer):
+    op, target, key, amount = code
+    match target:
+        case 'player':
+            owner = obj.game.player
+        case 'room':
+            owner = obj.game.player.current_room
+        case _:
+            owner = obj.field_owner(key)
+    if not owner == None:
+        setattr(owner,key,getattr(owner,key) - amount)
+    else:
+        setattr(obj,key,amount)
+
+# add values to the end of a list (and announce anything that turns up in a room)
+def op_append(obj,code,buffer):
+    op, key, values = code
+    owner = obj.field_owner(key)
+    if owner == None:
+        setattr(obj,key,list(values))
+        return
+    setattr(owner,key,getattr(owner,key) + list(values))
+    if key == 'items' and isinstance(owner,Room):
+        for value in values:
+            buffer.add('You found '+addArticle(value)+'!')
+
+# remove values from a list
+def op_remove(obj,code,buffer):
+    op, key, values = code
+    owner = obj.field_owner(key)
+    if not owner == None:
+        for value in values:
+            getattr(owner,key).remove(value)
+    else:
+        setattr(obj,key,[])
+
+# add a new key to a dictionary field
+def op_add_key(obj,code,buffer):
+    op, att, key, value = code
+    if obj.has_field(att):
+        dict = getattr(obj,att)
+    else:
+        dict = {}
+    dict[key] = value
+    setattr(obj,att,dict)
+
+# increment an integer field in the game.player
+def op_boost(obj,code,buffer):
+    op, key, amount = code
+    player = obj.game.player
+    if player.has_field(key):
+        value = getattr(player,key) + amount
+    else:
+        value = amount
+    setattr(player,key,value)
+
+# show the text in a field
+def op_print(obj,code,buffer):
+    buffer.add(getattr(obj,code[1]))
+
+# open a container or lockbox (the object itself if no item is named)
+def op_open(obj,code,buffer):
+    if code[1] == None:
+        item = obj
+    elif code[1] in obj.game.dungeon_items:
+        item = obj.game.dungeon_items[code[1]]
+    else:
+        return
+    if isinstance(item,Item) and item.has_field('kind') and item.kind in ['container','lockbox']:
+        buffer.add(item.open())
+
+# run a script belonging to the current room or a named monster, room, or item
+def op_run(obj,code,buffer):
+    op, name, field = code
+    target = find_script_object(obj.game,name)
+    if not target == None:
+        buffer.add(target.parse(getattr(target,field)))
+    else:
+        print(f'Error: Bad script: run {name} {field}')
+
+def op_unknown(obj,code,buffer):
+    print(f"Error: Script command '{code[1]}' not recognized")
+
+# lines that didn't compile were already reported when the script was loaded
+def op_bad(obj,code,buffer):
+    pass
+
+SCRIPT_OPS = {
+    'set': op_set,
+    'toggle': op_toggle,
+    'add': op_add,
+    'sub': op_sub,
+    'append': op_append,
+    'remove': op_remove,
+    'add_key': op_add_key,
+    'boost': op_boost,
+    'print': op_print,
+    'open': op_open,
+    'run': op_run,
+    'unknown': op_unknown,
+    'bad': op_bad,
+}
+
 # ==========================================================================
 # MESSAGE_BUFFER - Holds all output before sending it to the console/display
 # ==========================================================================
@@ -47,10 +487,65 @@ class MessageBuffer:
         for cmd in self.log:
             print(f'BUFFER: {cmd}')
 
+# ==========================================================================================
+# HISTORY - The commands typed during a game, newest first. Only the last 'size' commands
+#           are kept in memory (older ones drop off the end), so a long game never costs
+#           more to log. With a transcript file, every command is also written to disk.
+# ==========================================================================================
+class History:
+    def __init__(self,size=1000,filename=''):
+        self.commands = deque(maxlen=size)     # oldest on the left, newest on the right
+        self.filename = filename
+        self.file = None
+        self.count = 0                          # commands added so far (including those that dropped off)
+
+    def add(self,msg):
+        self.commands.append(msg)
+        self.count += 1
+        if len(self.filename)>0:
+            if self.file == None:
+                self.file = open(self.filename,'a',buffering=1)
+            self.file.write(msg+'\n')
+
+    def extend(self,msgs):
+        for msg in msgs:
+            self.add(msg)
+
+    # The last num commands, newest first
+    def last(self,num=25):
+        num = min(num,len(self.commands))
+        return [self.commands[-i] for i in range(1,num+1)]
+
+    def __len__(self):
+        return len(self.commands)
+
+    def __iter__(self):
+        return reversed(self.commands)
+
+    def clear(self):
+        self.commands.clear()
+
+    # Stop writing to the transcript file
+    def close(self):
+        if not self.file == None:
+            self.file.close()
+            self.file = None
+
+    # Close the transcript file and write any more commands to a different one
+    def switch_file(self,filename):
+        self.close()
+        self.filename = filename
+
+# An id no other game (in this process or any other) is using, for naming its transcript file
+game_numbers = itertools.count(1)
+
+def new_game_id():
+    return time.strftime('%Y%m%d-%H%M%S')+'-'+str(os.getpid())+'-'+str(next(game_numbers))
+
 # ================================================================
 # ITEM - Basic building block of other items and game objects
 # ================================================================
-class Item:
+class Item(Entity):
     def __init__(self,name):  
         self.id = name      
         self.name = name
@@ -58,32 +553,41 @@ class Item:
         self.in_use = False
         self.attributes = []
         
-        filename = os.path.join('data','items',self.id.replace(' ','_')+'.txt')
+        filename = Item.data_file(self.id)
         self.load(filename)
+
+    # Name of the data file that holds an item's configuration
+    @staticmethod
+    def data_file(name):
+        return os.path.join('data','items',name.replace(' ','_')+'.txt')
     
-    # Load specific item configuration details from external txt file
+    # Load specific item configuration details from external txt file (or the world cache)
     def load(self,filename):
         try:
-            lines = open(resource_path(filename),'r')
-            for line in lines:
-                if not line.startswith('#') and not line=='\n':  # Ignore comments and empty lines
-                    key, value = line.split('=')                
-                    value = value.strip()
-
-                    # Depending on the key, read the value as a list, integer, or string
-                    match key:
-                        case 'attributes'|'spells'|'contents'|'read_text':
-                            setattr(self,key.strip(),value.split(','))                
-                        case 'HP'|'to_hit'|'damage'|'break_HP':
-                            setattr(self, key.strip(),int(value))
-                        case _:
-                            setattr(self, key.strip(),value) 
+            fields = world_cache.read(filename,resource_path(filename),Item.read_fields)
+            for key, value in fields.items():
+                setattr(self,key,value)
         except:
             print(f'File read error: {filename} does not exist')            
 
-    # Reset item back to its initial values
-    def reset(self):
-        self.__init__(self.id)
+    # Parse the lines of an item file into a dictionary of fields
+    @staticmethod
+    def read_fields(lines):
+        fields = {}
+        for line in lines:
+            if not line.startswith('#') and not line=='\n':  # Ignore comments and empty lines
+                key, value = line.split('=')                
+                value = value.strip()
+
+                # Depending on the key, read the value as a list, integer, or string
+                match key:
+                    case 'attributes'|'spells'|'contents'|'read_text':
+                        fields[key.strip()] = value.split(',')
+                    case 'HP'|'to_hit'|'damage'|'break_HP':
+                        fields[key.strip()] = int(value)
+                    case _:
+                        fields[key.strip()] = value
+        return fields
 
     # Check if quality is in the objects attributes list (attributes are like metatags or flags)
     def isType(self,quality):
@@ -93,18 +597,18 @@ class Item:
     
     # Check if the item is of a particular kind (item,container,lockbox,etc)
     def isKind(self,kind):
-        if 'kind' in vars(self):
+        if self.has_field('kind'):
             return self.kind == kind
         return False
     
     # Have item return its description
     def describe(self):
         desc = ''
-        if 'describe_text' in vars(self):
+        if self.has_field('describe_text'):
             desc = self.describe_text
-        elif 'description' in vars(self):           
+        elif self.has_field('description'):           
             desc = self.description
-        elif 'read_text' in vars(self):
+        elif self.has_field('read_text'):
             desc = "There's something written here.\n"+self.read()
         else:
             desc = self.name+" looks pretty ordinary"
@@ -117,8 +621,8 @@ class Item:
     # Read readable item
     def read(self):
         desc = ''
-        if 'read_text' in vars(self):
-            desc = choose(self.read_text)
+        if self.has_field('read_text'):
+            desc = choose(self.read_text,self.rng())
         return desc
 
     # Displays active text for a light source if it is on
@@ -126,12 +630,12 @@ class Item:
         if self.in_use and self.isType('lightable'):
             return self.active_text
         else:
-            return choose(["The darkness presses in on you","It's pretty dark in here.","You can't see much more without more light","The darkness is overwhelming","The darkness is less of an old friend and more like a nosey neighbor who won't leave you alone."])
+            return choose(["The darkness presses in on you","It's pretty dark in here.","You can't see much more without more light","The darkness is overwhelming","The darkness is less of an old friend and more like a nosey neighbor who won't leave you alone."],self.rng())
             
     
     # Toggle an item field between True and False  
     def toggle(self,key):
-        if key in vars(self):
+        if self.has_field(key):
             value = getattr(self,key)
             if isinstance(value,str):
                 if value.lower() == 'false':
@@ -151,183 +655,12 @@ class Item:
     # If the item is readable, return a line read from the list of possible strings
     def get_line(self):
         if self.isType('readable'):
-            return choose(self.read_text)
+            return choose(self.read_text,self.rng())
     
-    # Object script handler - interprets short strings of commands and performs actions, changes, and interactions
-    def parse(self,cmdscript):
-        buffer = MessageBuffer()
-        lines = cmdscript.split(';')
-        for line in lines:
-            args = line.strip().split(' ')
-            cmd = args.pop(0)            
-            
-            match cmd:
-                # set a field to an integer, string, or the contents of another field
-                case 'set':
-                    key = args[0]
-                    if args[1] == 'to':
-                        setattr(self,key,getattr(self,args[2]))                        
-                    elif (args[1].isdigit()==True):
-                        value = int(args[1])
-                        setattr(self,key,value)
-                    else:
-                        value = args[1]
-                        setattr(self,key,value)                    
-                
-                case 'toggle':
-                    key = args[0]
-                    if key in vars(self):
-                        self.toggle(key)
-                    elif key in vars(game.player):
-                        game.player.toggle(key)
-                    elif key in vars(game.player.current_room):
-                        game.player.current_room.toggle(key)
-                    else:
-                        value = int(args[1])
-                        setattr(self,key,value)
-                
-                # increment a particular field in this item, the game.player, or the current room by a given amount. 
-                case 'add':
-                    key = args[0]                    
-                    if key in vars(self):
-                        value = getattr(self,key) + int(args[1])
-                        setattr(self,key,value)
-                    elif key in vars(game.player):
-                        value = getattr(game.player,key) + int(args[1])
-                        setattr(game.player,key,value)                        
-                    elif key in vars(game.player.current_room):
-                        value = getattr(game.player.current_room,key) + int(args[1])
-                        setattr(game.player.current_room,key,value)                        
-                    else:
-                        value = int(args[1])
-                        setattr(self,key,value)
-                
-                # decrement a particular field in this item, the game.player, or the current room by a given amount
-                case 'sub':
-                    key = args[0]
-                    if key in vars(self):
-                        value = getattr(self,key) - int(args[1])
-                        setattr(self,key,value)
-                    elif key== 'game.player':
-                        value = getattr(game.player,args[1]) - int(args[2])
-                        setattr(game.player,args[1],value)                        
-                    elif key in vars(game.player):
-                        value = getattr(game.player,key) - int(args[1])
-                        setattr(game.player,key,value)                        
-                    elif key == 'here':
-                        value = getattr(game.player.current_room,args[1]) - int(args[2])
-                        setattr(game.player.current_room,args[1],value)
-                        
-                    elif key in vars(game.player.current_room):
-                        value = getattr(game.player.current_room,key) - int(args[1])
-                        setattr(game.player.current_room,key,value)
-                        
-                    else:
-                        value = int(args[1])
-                        setattr(self,key,value)
-                
-                # append the value to a given list in this item, the game.player, or the room
-                case 'append':
-                    key = args.pop(0)                                     
-                    value = []   
-                    
-                    for arg in args:                        
-                        value.append(arg)                       
-
-                    if key in vars(self):
-                        start_list = getattr(self,key)                        
-                        setattr(self,key,value+start_list)
-                    elif key in vars(game.player):
-                        start_list = getattr(game.player,key)                        
-                        setattr(game.player,key,value+start_list)
-                    elif key in vars(game.player.current_room):
-                        start_list = getattr(game.player.current_room,key)
-                        setattr(game.player.current_room,key,value+start_list)
-                    else:
-                        setattr(self,key,value+start_list)
-
-                # remove a value from a given list in this item, the game.player, or the current room
-                case 'remove':
-                    key = args[0]
-                    value = []   
-                    for arg in args:                        
-                        value.append(arg)
-                    
-                    if key in vars(self):
-                        value = getattr(self,key).remove(args[1])
-                    elif key in vars(game.player):
-                        value = getattr(game.player,key).remove(args[1])                        
-                    elif key in vars(game.player.current_room):
-                        value = getattr(game.player.current_room,key).remove(args[1])
-                    else:
-                        setattr(self,key,[])                    
-                
-                # add a new key to a dictionary in the item
-                case 'add_key':
-                    att = args.pop(0)
-                    key = args.pop(0)
-                    value = "".join(args)
-                    try:
-                        dict = getattr(self,att)
-                        dict[key] = value
-                    except:
-                        dict = {}
-                        dict[key]=value
-                    setattr(self,att,dict)
-                
-                # increment an integer field in the game.player
-                case 'boost':
-                    key = args[0]
-                    if key in vars(game.player):
-                        value = getattr(game.player,key) + int(args[1])
-                    else:
-                        value = int(args[1])
-                    setattr(game.player,key,value)
-
-                # open a container or lockbox
-                case 'open':
-                    num = len(args)
-                    match num:
-                        case 0: 
-                            if self.kind in ['container','lockbox']:
-                                buffer.add(self.open())
-                        case 1:
-                            if arg[0] in game.dungeon_items.keys() and game.dungeon_items[arg[0]].kind in ['container','lockbox']:
-                                buffer.add(game.dungeon_items[arg[0]].open())
-                        case _:
-                            print('ERROR: Too many arguments for open script')                    
-
-                # run/interpret a provided object script                
-                case 'run':
-                    if len(args)>=2:
-                        obj = args.pop(0)
-                        objcmd = args.pop(0)      
-                        if obj == "current_room" or obj == 'here':                            
-                            objscript = getattr(game.player.current_room,objcmd)
-                            buffer.add(game.player.current_room.parse(objscript))
-                            
-                        elif obj in game.monsters.keys():
-                            objscript = getattr(game.monsters[obj],objcmd)
-                            buffer.add(game.monsters[obj].parse(objscript))
-                            
-                        elif obj in game.dungeon_rooms.keys():
-                            objscript = getattr(game.dungeon_rooms[obj],objcmd)
-                            buffer.add(game.dungeon_rooms[obj].parse(objscript))
-                            
-                        elif obj in game.dungeon_items.keys():                            
-                            objscript = getattr(game.dungeon_items[obj],objcmd)
-                            buffer.add(game.dungeon_items[obj].parse(objscript))
-                            
-                        else:
-                            print(f'Error: Bad script: {" ".join(args)}')
-                    
-                case _:
-                    return buffer.send()
-
     # Use or activate an item - if the item has an activate or invoke effect, it will run that script and display the corresponding text
     def activate(self):
         buffer = MessageBuffer()
-        if 'invoke_effect' in vars(self):            
+        if self.has_field('invoke_effect'):            
             if self.isType('togglable'):
                 buffer.add(self.parse(self.invoke_effect))
                 if self.in_use:
@@ -342,10 +675,10 @@ class Item:
                 buffer.add(self.invoke_text)
             
             if self.isType('lightable'):
-                buffer.add(game.player.current_room.describe())
+                buffer.add(self.game.player.current_room.describe())
             return buffer.send()
         
-        if 'activate_effect' in vars(self):            
+        if self.has_field('activate_effect'):            
             buffer.add(self.parse(self.activate_effect))
             if self.isType('togglable'):
                 if self.in_use:
@@ -356,7 +689,7 @@ class Item:
                 buffer.add(self.activate_text)
 
             if self.isType('lightable'):
-                buffer.add(game.player.current_room.describe())
+                buffer.add(self.game.player.current_room.describe())
             return buffer.send()
         buffer.add('You attempt to use '+self.name+', but nothing happens.')
         return buffer.send()
@@ -454,7 +787,7 @@ class Pile(Item):
     def __init__(self,name):        
         self.count=1000                     # Default pile size is 1000, but can be set lower
         Item.__init__(self,name)        
-        if not 'contents' in vars(self):
+        if not self.has_field('contents'):
             self.contents = ['rock']    
 
     # Is the pile empty?
@@ -467,9 +800,8 @@ class Pile(Item):
 
     # Take something from the pile (if the pile isn't empty)
     def take_one(self):
-        import random
         if self.count>0:
-            thing = self.contents[random.randint(0,len(self.contents))-1]
+            thing = self.contents[self.rng().randint(0,len(self.contents))-1]
             self.count = self.count-1
         else:
             thing=''           
@@ -487,7 +819,7 @@ class Container(Item):
     def __init__(self,name):
         self.openstate = 'closed'
         Item.__init__(self,name)        
-        if not 'contents' in vars(self):
+        if not self.has_field('contents'):
             self.contents = []    
 
     # Check if the container is open
@@ -597,7 +929,7 @@ class Lockbox(Container):
             else:
                 buffer.add('The '+self.name+' is now unlocked')
             if self.isTrapped():
-                if 'trap_effect' in vars(self):
+                if self.has_field('trap_effect'):
                     buffer.add('It was trapped! '+self.trap_effect)
                 else:
                     buffer.add('It was trapped!')
@@ -607,42 +939,49 @@ class Lockbox(Container):
 # MONSTER - Basic building block for all Non-Player Characters (people and creatures you 
 #           encounter in the game)
 # ============================================================================================
-class Monster:
+class Monster(Entity):
     def __init__(self,name):
         self.id=name
         self.name = name    
         self.attributes = []    
         self.responses = 'dlg_default'
         
-        filename = os.path.join('data','monsters',self.id.replace(' ','_')+'.txt')
+        filename = Monster.data_file(self.id)
         self.load(filename)
+
+    # Name of the data file that holds a monster's configuration
+    @staticmethod
+    def data_file(name):
+        return os.path.join('data','monsters',name.replace(' ','_')+'.txt')
     
-    # Load config file
+    # Load config file (or the world cache)
     def load(self,filename):
         try:
-            lines = open(resource_path(filename),'r')
-            for line in lines:
-                if not line.startswith('#') and not line=='\n':  # Ignore comments and empty lines
-                    key, value = line.split('=')
-                    if key=='treasure' or key=='block_direction' or key=='attributes' or key=='item':
-                        setattr(self,key.strip(),value.strip().split(','))
-                    else:
-                        value = value.strip()
-                        match key:
-                            case 'AC'|'HP'|'to_hit'|'damage':
-                                setattr(self, key.strip(),int(value))
-                            case _:
-                                setattr(self, key.strip(),value) 
-                    
-
+            fields = world_cache.read(filename,resource_path(filename),Monster.read_fields)
+            for key, value in fields.items():
+                setattr(self,key,value)
         except:
             print('Configuration file read error')
             raise
 
-    # Reset back to the starting values
-    def reset(self):
-        self.__init__(self.id)
-    
+    # Parse the lines of a monster file into a dictionary of fields
+    @staticmethod
+    def read_fields(lines):
+        fields = {}
+        for line in lines:
+            if not line.startswith('#') and not line=='\n':  # Ignore comments and empty lines
+                key, value = line.split('=')
+                if key=='treasure' or key=='block_direction' or key=='attributes' or key=='item':
+                    fields[key.strip()] = value.strip().split(',')
+                else:
+                    value = value.strip()
+                    match key:
+                        case 'AC'|'HP'|'to_hit'|'damage':
+                            fields[key.strip()] = int(value)
+                        case _:
+                            fields[key.strip()] = value
+        return fields
+
     # Does this monster have this quality/tag?
     def isType(self,quality):
         if quality in self.attributes:
@@ -651,7 +990,7 @@ class Monster:
     
     # Toggle an item field between True and False  
     def toggle(self,key):
-        if key in vars(self):
+        if self.has_field(key):
             value = getattr(self,key)
             if isinstance(value,str):
                 if value.lower() == 'false':
@@ -666,9 +1005,9 @@ class Monster:
 
     # Return the monster's description
     def describe(self):
-        if 'describe_text' in vars(self):
+        if self.has_field('describe_text'):
             return self.describe_text
-        elif 'description' in vars(self):           
+        elif self.has_field('description'):           
             return self.description
         else:
             desc = self.name+" looks like any other "+self.name
@@ -679,9 +1018,9 @@ class Monster:
         if len(phrase)>0:
             # 
             # REPLACE THIS WITH A RE SEARCH ON TOPIC and see if MONSTER has a RESPONSE
-            response = game.voices.get_line(self.id) 
+            response = self.game.voices.get_line(self.id,self.rng()) 
         else:
-            response = game.voices.get_line(self.id)
+            response = self.game.voices.get_line(self.id,self.rng())
         
         return "The "+self.name+" says: "+response
 
@@ -689,12 +1028,12 @@ class Monster:
         return self.describe()
 
     def roll_attack(self):
-        return roll(20,self.to_hit)
+        return roll(20,self.to_hit,self.rng())
     
 # ===============================================================================================
 # ROOM - Basic building block for all places/scenes that can be entered or visited in the game.
 # ===============================================================================================
-class Room:
+class Room(Entity):
     def __init__(self, id):
         self.id = id
         self.items = []        
@@ -709,31 +1048,40 @@ class Room:
         if not id == 'none':
             self.load(id)
     
-    # Load config file
+    # Load config file (or the world cache)
     def load(self,id):
         self.id = id
         try:
-            filename = os.path.join('data','rooms',self.id.replace(' ','_')+'.txt')            
-            lines = open(resource_path(filename),'r')
-            for line in lines:
-                if not line.startswith('#') and not line=='\n':  # Ignore comments and empty lines
-                    key, value = line.split('=')
-                    match key:
-                        case 'items'|'npcs'|'texts'|'solution'|'doors':
-                            setattr(self,key.strip(),value.strip().split(','))
-                        case 'map'|'dark_map':
-                            exits = value.strip().split(',')
-                            for exit in exits:
-                                dir,room = exit.split(':')
-                                self.map[dir] = room
-                        case _:
-                            setattr(self,key.strip(),value.strip())             
+            filename = Room.data_file(self.id)
+            fields = world_cache.read(filename,resource_path(filename),Room.read_fields)
+            for key, value in fields.items():
+                setattr(self,key,value)
         except:
             print(f'Error: No room configuration file for {id}.txt')            
-    
-    # Reset room back to initial values
-    def reset(self):
-        self.__init__(self.id)
+
+    # Name of the data file that holds a room's configuration
+    @staticmethod
+    def data_file(name):
+        return os.path.join('data','rooms',name.replace(' ','_')+'.txt')
+
+    # Parse the lines of a room file into a dictionary of fields
+    @staticmethod
+    def read_fields(lines):
+        fields = {}
+        for line in lines:
+            if not line.startswith('#') and not line=='\n':  # Ignore comments and empty lines
+                key, value = line.split('=')
+                match key:
+                    case 'items'|'npcs'|'texts'|'solution'|'doors':
+                        fields[key.strip()] = value.strip().split(',')
+                    case 'map'|'dark_map':
+                        exits = value.strip().split(',')
+                        for exit in exits:
+                            dir,room = exit.split(':')
+                            fields.setdefault('map',{})[dir] = room
+                    case _:
+                        fields[key.strip()] = value.strip()
+        return fields
     
     # Check if the room is lit
     def isLit(self):
@@ -749,7 +1097,7 @@ class Room:
 
     # Toggle an item field between True and False  
     def toggle(self,key):
-        if key in vars(self):
+        if self.has_field(key):
             value = getattr(self,key)
             if isinstance(value,str):
                 if value.lower() == 'false':
@@ -762,6 +1110,11 @@ class Room:
                 return
             setattr(self,key,value)
 
+    # Is this word or phrase mentioned in the room's description? (The index for a description is
+    # built once, so it follows along when the short description changes after a puzzle is solved.)
+    def mentions(self,phrase):
+        return keyword_index(self.short_description).mentions(phrase) or keyword_index(self.long_description).mentions(phrase)
+
     # Does the room has this monster or NPC 
     def isNPC(self,monster):
         try:
@@ -774,7 +1127,7 @@ class Room:
     # Does the room have someone blocking an exit?
     def hasBlocker(self):
         for monster in self.npcs:
-            if game.monsters[monster].isType('blocker'):
+            if self.game.monsters[monster].isType('blocker'):
                 return True
 
     # Return the room's npc that is a blocker 
@@ -783,8 +1136,8 @@ class Room:
     #      will need to be implemented    
     def getBlocker(self):
         for monster in self.npcs:
-            if game.monsters[monster].isType('blocker'):
-                return game.monsters[monster]            
+            if self.game.monsters[monster].isType('blocker'):
+                return self.game.monsters[monster]            
         return None
 
     # Add an exit to the room (not currently used)
@@ -801,20 +1154,20 @@ class Room:
 
     # Add an item to the room. If there is a pile and the item belongs to the pile, return it to the pile
     def add_item(self,item):
-        if item in game.dungeon_items.keys():
-            if hasattr(game.dungeon_items[item],'pile') and game.dungeon_items[item].pile in self.items:
-                game.dungeon_items[game.dungeon_items[item].pile].return_one()
+        if item in self.game.dungeon_items.keys():
+            if hasattr(self.game.dungeon_items[item],'pile') and self.game.dungeon_items[item].pile in self.items:
+                self.game.dungeon_items[self.game.dungeon_items[item].pile].return_one()
             else:
                 self.items.append(item)
     
     # Does this item exist in the room or one of the containers in the room?
     def has_item(self,item):    
         import re    
-        if item in game.dungeon_items.keys():
+        if item in self.game.dungeon_items.keys():
             if item in self.items:
                 return True
             for itm in self.items:
-                if game.dungeon_items[itm].kind in ['container','lockbox'] and game.dungeon_items[itm].has_item(item):
+                if self.game.dungeon_items[itm].kind in ['container','lockbox'] and self.game.dungeon_items[itm].has_item(item):
                     return True
         return False
 
@@ -827,11 +1180,20 @@ class Room:
         buffer.add(self.describe())
         return buffer.send()
     
-    def is_solution(self,solve):
-        if 'solution' in vars(self):
-            if solve in self.solution:                
-                return True
-        return False
+    # The room's trigger index (see TRIGGERS). It's kept with the room without counting as a change to
+    # the game, and built again if the room has been reset or reloaded or given a new list of solutions.
+    def triggers(self):
+        state = vars(self)
+        index = state.get('trigger_index')
+        solution = self.solution if self.has_field('solution') else None
+        if index == None or not index.template is state.get('template') or not index.solution is solution:
+            index = TriggerIndex(self)
+            state['trigger_index'] = index
+        return index
+
+    # The solution (as written in the room's file) that a command in canonical form is, or None if it isn't one
+    def find_solution(self,command):
+        return self.triggers().solutions.get(command)
 
     # Check if the solution command is one of the accepted solution
     def check_solution(self,solve):
@@ -847,7 +1209,7 @@ class Room:
                 # If using an item, check to see if the game.player has the item
                 case 'use':
                     tool = solve.replace('use ','')
-                    if game.player.has_item(tool):
+                    if self.game.player.has_item(tool):
                         buffer.add(self.run_solution())
                     else:
                         buffer.add("This seems like a brilliant idea. Too bad you don't have "+addArticle(tool))
@@ -855,21 +1217,21 @@ class Room:
                 # If unlocking a door or container, make certain there is enough light to do so
                 case 'unlock':
                     locked_thing = solve.replace('unlock ','')
-                    if game.player.current_room.isLit() or game.player.has_light():
-                        if locked_thing in game.player.current_room.items:
-                            if hasattr('unlock_key',game.dungeon_items[locked_thing]) and game.dungeon_items[locked_thing].unlock_key in game.player.inventory:
+                    if self.game.player.current_room.isLit() or self.game.player.has_light():
+                        if locked_thing in self.game.player.current_room.items:
+                            if hasattr('unlock_key',self.game.dungeon_items[locked_thing]) and self.game.dungeon_items[locked_thing].unlock_key in self.game.player.inventory:
                                 buffer.add(self.run_solution())
                             else:
                                 buffer.add('If only you had something to unlock the '+locked_thing+' with')
                     
-                        elif locked_thing == 'door' or locked_thing in game.player.current_room.doors:
-                            if len(game.player.current_room.doors) == 1:
-                                door_key = game.player.current_room.doors[0].replace('_',' ')
-                                if game.dungeon_items[door_key].unlock_key in game.player.inventory:
+                        elif locked_thing == 'door' or locked_thing in self.game.player.current_room.doors:
+                            if len(self.game.player.current_room.doors) == 1:
+                                door_key = self.game.player.current_room.doors[0].replace('_',' ')
+                                if self.game.dungeon_items[door_key].unlock_key in self.game.player.inventory:
                                     buffer.add(self.run_solution())
                                 else:
                                     buffer.add("You don't seem to have the right key.")
-                            elif locked_thing in game.player.current_room.doors and game.dungeon_items[locked_thing].unlock_key in game.player.inventory:
+                            elif locked_thing in self.game.player.current_room.doors and self.game.dungeon_items[locked_thing].unlock_key in self.game.player.inventory:
                                     buffer.add(self.run_solution())
                             else:
                                 buffer.add('You try to unlock '+locked_thing+', but fail.')
@@ -883,123 +1245,13 @@ class Room:
                     buffer.add(self.run_solution())
         return buffer.send()
 
-    # Parse and execute room script (similar to the Item script parser/interpreter)
-    def parse(self,cmdscript):
-        buffer = MessageBuffer()
-        lines = cmdscript.split(';')
-        for line in lines:
-            args = line.strip().split(' ')
-            cmd = args.pop(0)            
-            match cmd:
-                case 'set':
-                    key = args[0]
-                    if args[1] == 'to':
-                        setattr(self,key,getattr(self,args[2]))                        
-                    elif (args[1].isdigit()==True):
-                        value = int(args[1])
-                        setattr(self,key,value)
-                    else:
-                        value = args[1]
-                        setattr(self,key,value)                    
-
-                case 'add':
-                    key = args[0]
-                    if key in vars(self):
-                        value = getattr(self,key) + int(args[1])
-                    else:
-                        value = int(args[1])
-                    setattr(self,key,value)
-                case 'sub':
-                    key = args[0]
-                    if key in vars(self):
-                        value = getattr(self,key) - int(args[1])
-                    else:
-                        value = int(args[1])
-                    setattr(self,key,value)
-                case 'append':
-                    key = args.pop(0)
-                    if key == 'inventory':
-                        for arg in args:
-                            value = game.player.inventory + [arg]                        
-                    
-                    for arg in args:
-                        if key in vars(self):
-                            value = getattr(self,key)+[arg] 
-                            if key == 'items':
-                                buffer.add('You found '+addArticle(arg)+'!')
-                        else:
-                            value = arg
-                        setattr(self,key,value)
-                case 'remove':
-                    key = args[0]
-                    if key == 'inventory':
-                        for arg in args:
-                            value = game.player.inventory.remove(arg)                        
-                    
-                    if key in vars(self):
-                        value = getattr(self,key).remove(args[1])
-                    else:
-                        setattr(self,key,[])                    
-                case 'add_key':
-                    att = args.pop(0)
-                    key = args.pop(0)
-                    value = "".join(args)
-                    
-                    if att in vars(self):
-                        dict = getattr(self,att)
-                        dict[key] = value
-                    else:
-                        dict = {}
-                        dict[key]=value
-                    setattr(self,att,dict)
-                case 'boost':
-                    key = args[0]
-                    if key in vars(game.player):
-                        value = getattr(game.player,key) + int(args[1])
-                    else:
-                        value = int(args[1])
-                    setattr(game.player,key,value)
-                case 'print':
-                    buffer.add(getattr(self,args[0]))
-
-                # open a container or lockbox
-                case 'open':
-                    if arg[0] in game.dungeon_items.keys() and game.dungeon_items[arg[0]].kind in ['container','lockbox']:
-                        buffer.add(game.dungeon_items[arg[0]].open())
-                
-                # run a script associated with a room, monster, or item
-                case 'run':                    
-                    if len(args)>=2:
-                        obj = args.pop(0)
-                        objcmd = args.pop(0)      
-                        if obj == "current_room" or obj == 'here':                            
-                            objscript = getattr(game.player.current_room,objcmd)
-                            buffer.add(game.player.current_room.parse(objscript))
-                       
-                        elif obj in game.monsters.keys():
-                            objscript = getattr(game.monsters[obj],objcmd)
-                            buffer.add(game.monsters[obj].parse(objscript))
-                       
-                        elif obj in game.dungeon_rooms.keys():
-                            objscript = getattr(game.dungeon_rooms[obj],objcmd)
-                            buffer.add(game.dungeon_rooms[obj].parse(objscript))
-                       
-                        elif obj in game.dungeon_items.keys():                            
-                            objscript = getattr(game.dungeon_items[obj],objcmd)
-                            buffer.add(game.dungeon_items[obj].parse(objscript))
-                       
-                        else:
-                            print(f'Error: Bad script: {" ".join(args)}')
-                    else:
-                        print(f'Error (ROOM): {" ".join(args)} not properly formatted')
-
-                case _:                    
-                    print(f"Error: Room script not recognized")
-        return buffer.send()
+    # Room scripts can reach the room's own fields and the game.player's
+    def script_scope(self):
+        return [self.game.player]
 
     # Show the results of search
     def show(self):
-        if 'hidden' in vars(self):
+        if self.has_field('hidden'):
             return self.parse(self.hidden)            
 
     # Display any items in the room
@@ -1015,8 +1267,8 @@ class Room:
                 itmlist = get_list_as_string(self.items)
                 buffer.add('You see '+itmlist+' here.')
             for itm in self.items:
-                if game.dungeon_items[itm].kind in ['container','lockbox'] and game.dungeon_items[itm].isOpen():
-                    buffer.add(game.dungeon_items[itm].spill())
+                if self.game.dungeon_items[itm].kind in ['container','lockbox'] and self.game.dungeon_items[itm].isOpen():
+                    buffer.add(self.game.dungeon_items[itm].spill())
         return buffer.send()
     
     # Display the npcs in the room
@@ -1024,9 +1276,9 @@ class Room:
         msg = ''
         if len(self.npcs)>0:            
             if len(self.npcs) == 1:
-                msg = 'You see '+addArticle(game.monsters[self.npcs[0]].name)+' here.'
+                msg = 'You see '+addArticle(self.game.monsters[self.npcs[0]].name)+' here.'
             elif len(self.items) == 2:
-                msg = 'The '+game.monsters[self.npcs[0]].name+' and '+game.monsters[self.npcs[0]].name+' are here.'
+                msg = 'The '+self.game.monsters[self.npcs[0]].name+' and '+self.game.monsters[self.npcs[0]].name+' are here.'
             else:
                 room_npcs = get_list_as_string(self.npcs)
                 msg = 'You see' + room_npcs
@@ -1042,7 +1294,7 @@ class Room:
     def describe(self):
         buffer = MessageBuffer()
         buffer.add('\n<< '+self.name+' >>')
-        if self.isLit() or game.player.has_light():
+        if self.isLit() or self.game.player.has_light():
             if self.count == 0:
                 buffer.add(self.long_description.strip())
                 self.count += 1
@@ -1057,13 +1309,13 @@ class Room:
                 buffer.add('')
 
             if not itms == None and not itms == '':
-                buffer.add(self.display_items())
+                buffer.add(itms)
             if not npcs == None and not npcs == '':
-                buffer.add(self.display_npcs())
+                buffer.add(npcs)
             if not exits == None and not exits == '':
-                buffer.add(self.display_exits())
+                buffer.add(exits)
         else:
-            if 'dark_description' in vars(self):
+            if self.has_field('dark_description'):
                 buffer.add(self.dark_description)
             else:
                 buffer.add("It's very dark. You can't see anything.")
@@ -1093,12 +1345,120 @@ def load_dungeon():
         roomlist[name]=Room(name)
     
     return roomlist
+# ==========================================================================================
+# KEYWORDS - An index of the words and short phrases in a piece of text (like a room
+#            description), so checking whether something is mentioned is a set lookup. What
+#            the player typed is always matched literally, never as a regular expression.
+# ==========================================================================================
+KEYWORD_PATTERN = re.compile(r"[a-z0-9']+")
+KEYWORD_MAX_PHRASE = 4          # longest phrase (in words) that goes in the index
+
+# Split text into lowercase words, ignoring punctuation
+def keywords(text):
+    return KEYWORD_PATTERN.findall(text.lower())
+
+class KeywordIndex:
+    def __init__(self,text):
+        words = keywords(text)
+        self.text = ' '+' '.join(words)+' '
+        self.phrases = set()
+        for i in range(len(words)):
+            self.phrases.update(word_forms(words[i]))
+            for n in range(2,KEYWORD_MAX_PHRASE+1):
+                if i+n <= len(words):
+                    self.phrases.add(' '.join(words[i:i+n]))
+
+    # Is the word or phrase mentioned in the text? (Single words also match their singular/plural forms.)
+    def mentions(self,phrase):
+        words = keywords(phrase)
+        if len(words) == 0:
+            return len(phrase.strip()) == 0     # nothing typed matches anything, like an empty search
+        phrase = ' '.join(words)
+        if len(words) <= KEYWORD_MAX_PHRASE:
+            return phrase in self.phrases
+        return ' '+phrase+' ' in self.text
+
+# Indexes for every piece of text that has been looked at, keyed by the text itself
+keyword_indexes = {}
+
+def keyword_index(text):
+    index = keyword_indexes.get(text)
+    if index is None:
+        index = KeywordIndex(text)
+        keyword_indexes[text] = index
+    return index
+
+# ==========================================================================================
+# NOUNS - An index from every way of referring to an item (its full name, singular and plural
+#         forms, and the words in it) to the items it could mean. It only needs the item names,
+#         so building it doesn't load any items.
+# ==========================================================================================
+NOUN_SCOPES = ['inventory','carried','room','in room']     # where the player can see things, nearest first
+NOUN_STOPWORDS = ['a','an','the','of','some']
+
+# Singular and plural spellings of a word (good enough for names like 'bone', 'rocks', or 'boxes')
+def word_forms(word):
+    forms = [word]
+    if word.endswith('es'):
+        forms.append(word[:-2])
+    if word.endswith('s'):
+        forms.append(word[:-1])
+    else:
+        forms.append(word+'s')
+        forms.append(word+'es')
+    return forms
+
+# Every form of an item's name that should find it
+def noun_forms(name):
+    words = name.lower().split(' ')
+    forms = set()
+    for form in word_forms(words[-1]):
+        forms.add(' '.join(words[:-1]+[form]))
+    for word in words:
+        if not word in NOUN_STOPWORDS:
+            forms.update(word_forms(word))
+    return forms
+
+class NounIndex:
+    def __init__(self,names=[]):
+        self.forms = {}             # form -> set of item names
+        for name in names:
+            self.add(name)
+
+    def add(self,name):
+        for form in noun_forms(name):
+            self.forms.setdefault(form,set()).add(name)
+
+    # Every item the noun could refer to (anywhere in the world)
+    def candidates(self,noun):
+        return self.forms.get(noun.strip().lower(),set())
+
+# Lists of things in a command: 'sword and key', 'rock, bone', or 'all except lantern'
+NOUN_ALL = ['all','everything']
+NOUN_LIST_PATTERN = re.compile(r'\s*,\s*(?:and\s+)?|\s+and\s+')
+NOUN_EXCEPT_PATTERN = re.compile(r'\s+(?:except|but)(?:\s+for)?\s+')
+
+# Split the things named in a command into the ones meant and the ones left out
+# ('rock, bone and key' -> ['rock','bone','key'], [] and 'everything but lantern' -> ['all'], ['lantern'])
+def noun_list(phrase):
+    parts = NOUN_EXCEPT_PATTERN.split(phrase.strip(),1)
+    nouns = ['all' if noun in NOUN_ALL else noun for noun in NOUN_LIST_PATTERN.split(parts[0]) if len(noun)>0]
+    exceptions = []
+    if len(parts)>1:
+        exceptions = [noun for noun in NOUN_LIST_PATTERN.split(parts[1]) if len(noun)>0]
+    return nouns, exceptions
+
+# Does a noun list name more than one thing?
+def is_many(nouns,exceptions):
+    return len(nouns)>1 or len(exceptions)>0 or nouns == ['all']
+
 # ====================================================================================================
 # PLAYER - Controls and manages the game.player's interaction with the world, in terms of environment, 
 #          items, and creatures
 # ====================================================================================================
 class Player:    
-    def __init__(self,start='starting_room'):
+    def __init__(self,game,start='starting_room'):
+        self.game = game
         self.name = 'Player'        
         self.inventory = []
         self.start_room =start        
@@ -1110,24 +1470,37 @@ class Player:
         self.light_source='none'   
         self.container_list=[]
 
+    # Every change to the player moves the game's state version on (see Console.memoized)
+    def __setattr__(self,key,value):
+        self.__dict__[key] = value
+        game = self.__dict__.get('game')
+        if not game == None:
+            game.state_version += 1
+
     # Set the current room back to the default starting room
     def start(self):
-        self.current_room = game.dungeon_rooms[self.start_room]
+        self.current_room = self.game.dungeon_rooms[self.start_room]
+        if self.game.prefetch == 'true':
+            prefetch_neighbours(self.current_room)
     
     # Reset Player back to starting values
     def reset(self):
         self.name = 'Player'        
         self.inventory = []
-        self.current_room = game.dungeon_rooms['starting_room']
+        self.current_room = self.game.dungeon_rooms['starting_room']
         self.AC = 14
         self.HP = 20
         self.weapon = 'fist'
         self.light_source='none'       
         self.container_list=[]
-    
+
+    # Check if the player has a field (same as for rooms, items, and monsters)
+    def has_field(self,key):
+        return key in vars(self)
+
     # Toggle an item field between True and False  
     def toggle(self,key):
-        if key in vars(self):
+        if self.has_field(key):
             value = getattr(self,key)
             if isinstance(value,str):
                 if value.lower() == 'false':
@@ -1143,8 +1516,8 @@ class Player:
     # Roll attack using a 20-sided die
     def roll_attack(self,weapon='weapon'):
         if weapon=='weapon':
-            return roll(20,game.dungeon_items[self.weapon].to_hit)
-        return roll(20,game.dungeon_items[weapon].to_hit)        
+            return roll(20,self.game.dungeon_items[self.weapon].to_hit,self.game.rng)
+        return roll(20,self.game.dungeon_items[weapon].to_hit,self.game.rng)        
     
     # Take damage. Return True if game.player takes enough damage to die
     def take_damage(self,amount):
@@ -1155,17 +1528,17 @@ class Player:
     def attack(self,enemy,special):    
         buffer = MessageBuffer()
         # if the monster isn't here, skip the attack
-        if not enemy in game.player.current_room.npcs:
+        if not enemy in self.current_room.npcs:
             return "You don't see "+addArticle(enemy)+" here to attack."
         
         # look up enemy info
-        monster = game.monsters[enemy]    
+        monster = self.game.monsters[enemy]    
         crit_mod = 1    
         crit_text = ''
         if special == 'weapon':
-            pc_weapon = game.dungeon_items[self.weapon]      # Creating a copy to make it easier to reference
+            pc_weapon = self.game.dungeon_items[self.weapon]      # Creating a copy to make it easier to reference
         else:
-            pc_weapon = game.dungeon_items[special]          # Override the current weapon to use fist or foot
+            pc_weapon = self.game.dungeon_items[special]          # Override the current weapon to use fist or foot
 
         weapon_name = pc_weapon.name
         
@@ -1185,17 +1558,17 @@ class Player:
             monster.HP = monster.HP - crit_mod*pc_weapon.damage
             buffer.add(crit_text)
             buffer.add(pc_weapon.hit_text)
-            game.monsters[enemy] = monster
+            self.game.monsters[enemy] = monster
             if monster.HP<=0:                
                 buffer.add('[[You have slain the '+monster.name)
                 buffer.add(monster.death_text)
                 monster.HP = 0
-                game.monsters[enemy] = monster
-                game.player.current_room.items.append(monster.corpse)                
-                game.player.current_room.items = game.player.current_room.items + monster.item
+                self.game.monsters[enemy] = monster
+                self.current_room.items.append(monster.corpse)                
+                self.current_room.items = self.current_room.items + monster.item
                 
-                game.player.current_room.npcs.remove(enemy)                
-                buffer.add(game.player.current_room.enter())
+                self.current_room.npcs.remove(enemy)                
+                buffer.add(self.current_room.enter())
                 return buffer.send()
         else:
             # game.player misses monster
@@ -1225,22 +1598,20 @@ class Player:
                 if targets[0] in self.current_room.npcs:
                     target = targets.pop(0)
                     buffer.add('You talk to the '+target+'.')
-                    if game.monsters[target].isType('talkative'):                                    
-                        buffer.add(game.monsters[target].respond())
+                    if self.game.monsters[target].isType('talkative'):                                    
+                        buffer.add(self.game.monsters[target].respond())
                     else:
                         buffer.add('The '+target+' does not appear to enjoy your attempts at small talk.')
                 else:
                     target = " ".join(targets)
                     for npc in self.current_room.npcs:
-                        match_short = re.search(target,self.current_room.short_description)
-                        match_long = re.search(target,self.current_room.long_description)
-                        if match_short==None and match_long==None:
+                        if not self.current_room.mentions(target):
                             if re.search(npc,target)==None:
                                 buffer.add("I don't see "+addArticle(target)+" here. You must be hallucinating.")                        
                             else:
                                 print(f'You talk to the {npc}')
-                                if game.monsters[npc].isType('talkative'):                                    
-                                    buffer.add(game.monsters[npc].respond())
+                                if self.game.monsters[npc].isType('talkative'):                                    
+                                    buffer.add(self.game.monsters[npc].respond())
                                 else:
                                     buffer.add("The "+npc+" doesn't respond to your small talk")
 
@@ -1252,7 +1623,7 @@ class Player:
         else:
             if len(targets)>0:
                 target = " ".join(targets)
-                if re.search(target,self.current_room.short_description)==None and re.search(target,self.current_room.long_description)==None:
+                if not self.current_room.mentions(target):
                     buffer.add("You don't see "+addArticle(target)+" to speak to.")
                 else:
                     buffer.add("You try speaking to the "+target+", but it doesn't respond. Perhaps it's shy?")
@@ -1271,26 +1642,28 @@ class Player:
                     buffer.add(blocker.block_text)
                 else:
                     buffer.add('The '+blocker.name+' ignores your cowardly retreat.')
-                    self.current_room = game.dungeon_rooms[self.current_room.map[direction]]
+                    self.current_room = self.game.dungeon_rooms[self.current_room.map[direction]]
                     buffer.add(self.current_room.enter())
             else:
-                self.current_room = game.dungeon_rooms[self.current_room.map[direction]]
+                self.current_room = self.game.dungeon_rooms[self.current_room.map[direction]]
                 buffer.add(self.current_room.enter())
-                if 'game_exit' in vars(self.current_room):
-                    game.game_won = True
+                if self.current_room.has_field('game_exit'):
+                    self.game.game_won = True
                     buffer.add('[END]')
+            if self.game.prefetch == 'true':
+                prefetch_neighbours(self.current_room)
         
         # check for short versions
         elif direction in ['n','s','w','e']:
             match direction:
                 case 'n':
-                    buffer.add(game.player.move('north'))
+                    buffer.add(self.move('north'))
                 case 's':
-                    buffer.add(game.player.move('south'))
+                    buffer.add(self.move('south'))
                 case 'w':
-                    buffer.add(game.player.move('west'))
+                    buffer.add(self.move('west'))
                 case 'e':
-                    buffer.add(game.player.move('east'))
+                    buffer.add(self.move('east'))
                 case _:
                     buffer.add('Where am I?')
         else:
@@ -1321,8 +1694,8 @@ class Player:
         if len(self.inventory)>0:
             buffer.add("You are carrying: "+get_list_as_string(self.inventory))
             for thing in self.container_list:
-                if not game.dungeon_items[thing].isEmpty():
-                    buffer.add("The "+thing+" contains: "+get_list_as_string(game.dungeon_items[thing].contents))
+                if not self.game.dungeon_items[thing].isEmpty():
+                    buffer.add("The "+thing+" contains: "+get_list_as_string(self.game.dungeon_items[thing].contents))
         else:
             buffer.add("You don't have anything")    
         return buffer.send()
@@ -1333,11 +1706,11 @@ class Player:
         if not self.has_item(item):
             buffer.add('You add the '+item+' to your inventory')
             self.inventory.append(item)
-            if game.dungeon_items[item].isKind('weapon'):                        
+            if self.game.dungeon_items[item].isKind('weapon'):                        
                 self.weapon = item
-            if game.dungeon_items[item].isType('lightable'):
+            if self.game.dungeon_items[item].isType('lightable'):
                 self.light_source = item
-            if game.dungeon_items[item].kind in ['container','lockbox']:
+            if self.game.dungeon_items[item].kind in ['container','lockbox']:
                 self.container_list.append(item)
         else:
             buffer.add("You've already got "+addArticle(item)+", no need to take another.")    
@@ -1355,8 +1728,8 @@ class Player:
                     self.light_source = 'none'             
                 return
             for itm in self.container_list:
-                if game.dungeon_items[itm].has_item(itm):
-                    game.dungeon_items[itm].remove_item(itm)
+                if self.game.dungeon_items[itm].has_item(itm):
+                    self.game.dungeon_items[itm].remove_item(itm)
                     if item == self.weapon:
                         self.weapon = 'fist'
                     if item == self.light_source:
@@ -1371,22 +1744,56 @@ class Player:
     def has_light(self):
         # Check if the game.player has a light source that isn't inside a container
         for itm in self.inventory:
-            if game.dungeon_items[itm].isType('lightable'):
-                return game.dungeon_items[itm].in_use == True
+            if self.game.dungeon_items[itm].isType('lightable'):
+                return self.game.dungeon_items[itm].in_use == True
         return False
     
+    # Does the player have anything that could be called this?
     def has_possible_matches(self,item):
-        possible_matches = []
-        for itm in game.dungeon_items:            
-            if item in itm:
-                possible_matches.append(itm)
-        
-        if len(possible_matches)>0:
-            for itm in possible_matches:
-                if self.has_item(itm):
-                    return True
-       
-        return False
+        return len(self.resolve(item,['inventory','carried']))>0
+
+    # Everything the player can see, as item name -> where it is (one of NOUN_SCOPES)
+    def visible_items(self,scopes=NOUN_SCOPES):
+        visible = {}
+        for scope in reversed(scopes):
+            match scope:
+                case 'inventory':
+                    names = self.inventory
+                case 'carried':
+                    names = [itm for box in self.container_list for itm in self.game.dungeon_items[box].contents]
+                case 'room':
+                    names = self.current_room.items
+                case 'in room':
+                    names = []
+                    for box in self.current_room.items:
+                        box = self.game.dungeon_items[box]
+                        if box.kind in ['container','lockbox'] and box.isOpen():
+                            names = names + box.contents
+            for name in names:
+                visible[name] = scope
+        return visible
+
+    # Find the visible items a noun could refer to, nearest first. An exact name always wins.
+    # visible can be passed in when several nouns are looked up against the same things.
+    def resolve(self,noun,scopes=NOUN_SCOPES,visible=None):
+        if visible == None:
+            visible = self.visible_items(scopes)
+        if noun in visible:
+            return [noun]
+        candidates = self.game.nouns.candidates(noun)
+        if len(candidates) > len(visible):
+            matches = [name for name in visible if name in candidates]
+        else:
+            matches = [name for name in candidates if name in visible]
+        matches.sort(key=lambda name: (scopes.index(visible[name]),name))
+        return matches
+
+    # Turn a noun into the name of the one visible item it refers to (or leave it alone if it's ambiguous or unknown)
+    def resolve_one(self,noun,scopes=NOUN_SCOPES,visible=None):
+        matches = self.resolve(noun,scopes,visible)
+        if len(matches) == 1:
+            return matches[0]
+        return noun
 
     # Check if item is in the game.player's inventory
     def has_item(self,item):
@@ -1394,8 +1801,8 @@ class Player:
             return True
         if len(self.container_list)>0:
             for itm in self.container_list:
-                if not game.dungeon_items[itm].isEmpty():
-                    if game.dungeon_items[itm].has_item(item):
+                if not self.game.dungeon_items[itm].isEmpty():
+                    if self.game.dungeon_items[itm].has_item(item):
                         return True
             return False
         
@@ -1408,15 +1815,15 @@ class Player:
         if item == 'corpse':
             for itm in self.current_room.items:
                 if not re.search('corpse',itm)=='None':
-                    return game.dungeon_items[itm].describe()
+                    return self.game.dungeon_items[itm].describe()
                 
         if self.has_item(item):
-            return game.dungeon_items[item].describe()
+            return self.game.dungeon_items[item].describe()
         
-        if re.search(item,self.current_room.short_description)==None and re.search(item,self.current_room.long_description)==None:
+        if not self.current_room.mentions(item):
             return "It's hard to describe something that isn't here."
-        elif 'texts' in vars(self.current_room) and item in self.current_room.texts:
-            return game.handle('read '+item)
+        elif self.current_room.has_field('texts') and item in self.current_room.texts:
+            return self.game.handle('read '+item)
         else:            
             return 'There is nothing remarkable about the '+item
 
@@ -1426,95 +1833,173 @@ class Player:
             return 'You already have '+addArticle(item)+'. You decide not to be greedy.'
         return self.add_item(item)
     
+    # Run the room's script for taking an item, if it has one
+    def take_trigger(self,item):
+        script = self.current_room.triggers().take_script(item)
+        if script == None:
+            return ''
+        output = self.current_room.run_script(script)
+        return '' if output == None else output
+
+    # Take an item lying in the room, returning what happened and whether the item should come out of
+    # the room's list of items (left to the caller, so several items can be taken out at once)
+    def take_from_room(self,item):
+        # If the item is a corpse, leave it alone
+        if not re.search('corpse',item) == None:
+            return "You sicko. Why are you tampering with the "+item+"? Let the poor thing rest in peace.", False
+        if not item in self.game.dungeon_items.keys():
+            return None, False
+        itm = self.game.dungeon_items[item]
+
+        # If the item is actually a pile, then only take one thing from the pile
+        if itm.isKind('pile'):
+            thing = itm.take_one()
+            if not thing == '' and thing in self.inventory:
+                return 'You already have '+addArticle(thing)+'. You decide not to be greedy.', False
+            return self.add_item(thing), False
+
+        # If the item is locked (can't be taken until a condition is met)
+        elif itm.isType('locked'):
+            return "Try as you might, you just can't get the "+item+" free.", False
+
+        # If the item is marked as immovable (can't be taken)
+        elif itm.isType('immovable'):
+            return "You can't seem to move it. The "+item+" isn't going anywhere.", False
+
+        # If the item is plural (ie. multiple exist), only one in the inventory at a time.
+        # This covers duplicate items that aren't pulled from piles
+        elif itm.isType('plural'):
+            return self.take_plural_item(item), False
+
+        # If the item is a normal item
+        return self.add_item(item), True
+
+    # Where everything that can be taken in the room is, as item name -> 'room' or the open container
+    # it's in (only the things in one container if holder is given)
+    def item_places(self,holder=None):
+        places = {}
+        for itm in self.current_room.items:
+            if holder == None:
+                places[itm] = 'room'
+            box = self.game.dungeon_items[itm]
+            if box.kind in ['container','lockbox'] and box.isOpen() and (holder == None or holder == itm):
+                for thing in box.contents:
+                    places[thing] = itm
+        return places
+
+    # Take several things at once ('sword and key', 'all except lantern', 'all from chest'). The room is
+    # looked through once, and the room and containers are only updated once everything has been taken,
+    # so the cost depends on how many things are taken rather than on how many there are in the room.
+    def take_items(self,nouns,exceptions=[],source=None):
+        buffer = MessageBuffer()
+
+        # Taking things out of a container that's being carried
+        if not source == None:
+            source = self.resolve_one(source)
+            if source in self.container_list:
+                visible = self.visible_items(['carried'])
+                contents = list(self.game.dungeon_items[source].contents)
+                names = contents if 'all' in nouns else [self.resolve_one(noun,['carried'],visible) for noun in nouns]
+                excluded = [self.resolve_one(noun,['carried'],visible) for noun in exceptions]
+                for name in names:
+                    if not name in excluded:
+                        buffer.add(self.pull_out_item(name,source))
+                return buffer.send()
+            if not source in self.current_room.items:
+                return "You don't see "+addArticle(source)+" here."
+            box = self.game.dungeon_items[source]
+            if not box.kind in ['container','lockbox']:
+                return "There's nothing in the "+source+" to take."
+            if not box.isOpen():
+                return 'The '+source+' is closed.'
+
+        places = self.item_places(source)
+        visible = {}
+        for name, holder in places.items():
+            visible[name] = 'room' if holder == 'room' else 'in room'
+        if 'all' in nouns:
+            if len(places) == 0:
+                return "There's nothing to pick up here" if source == None else 'The '+source+' is empty.'
+            names = list(places)
+        else:
+            names = [self.resolve_one(noun,NOUN_SCOPES,visible) for noun in nouns]
+        excluded = set([self.resolve_one(noun,NOUN_SCOPES,visible) for noun in exceptions])
+
+        taken = set()
+        for name in names:
+            if name in excluded or name in taken:
+                continue
+
+            # Anything that isn't lying around (or can't be told apart) gets the usual answer
+            if not name in places:
+                message = self.pick_up(name)
+                buffer.add(message if not message == '' else "You don't see "+addArticle(name)+" here.")
+                continue
+
+            # Things in a container that was just taken come along with it
+            holder = places[name]
+            if holder in taken:
+                continue
+            trigger = self.take_trigger(name)
+            if not trigger == '':
+                buffer.add(trigger)
+            if holder == 'room':
+                message, moved = self.take_from_room(name)
+            else:
+                message, moved = self.add_item(name), True
+            buffer.add(message)
+            if moved:
+                taken.add(name)
+        if len(buffer.log) == 0:
+            return "There's nothing else to pick up here"
+
+        # Take everything out of the room and containers in one go
+        if len(taken)>0:
+            self.current_room.items = [itm for itm in self.current_room.items if not itm in taken]
+            for holder in set([places[name] for name in taken]):
+                if not holder == 'room':
+                    box = self.game.dungeon_items[holder]
+                    box.contents = [itm for itm in box.contents if not itm in taken]
+        return buffer.send()
+
     # Pick up item and add it to the game.player inventory
     def pick_up(self, item):    
         import re    
         buffer = MessageBuffer()
 
         # Check to see if there is a script to run when the item is taken
-        if "on_take" in vars(self.current_room):
-            take_key = 'on_take_'+item
-            if take_key in vars(self.current_room):
-                line = getattr(self.current_room,take_key)
-                cmds = line.split(';')
-                for cmd in cmds:
-                    result = self.current_room.parse(cmd)
-                    if not result == '':
-                        buffer.add(self.current_room.parse(cmd))
-
-        # If the game.player takes all, run through the list picking up items individually
-        if item in ['all','everything']:
-            if self.current_room.items == []:
-                buffer.add("There's nothing to pick up here")
-            else:
-                itmlist=[]
-                for itm in self.current_room.items:
-                    itmlist.append(itm)                    
-                    if game.dungeon_items[itm].kind in ['container','lockbox'] and game.dungeon_items[itm].isOpen():
-                        itmlist = itmlist+game.dungeon_items[itm].contents
-            
-                while not itmlist==[]:
-                    itm = itmlist.pop(0)
-                    buffer.add(self.pick_up(itm))
+        trigger = self.take_trigger(item)
+        if not trigger == '':
+            buffer.add(trigger)
+
+        # If the game.player takes all, pick up everything in one go
+        if item in NOUN_ALL:
+            buffer.add(self.take_items(['all']))
         else:
             
             # If the item is currently in the room's list of items (ie. it's present and recognized as an object)
             if item in self.current_room.items:                     
-                
-                # If the item is a corpse, leave it alone
-                if not re.search('corpse',item) == None:
-                    buffer.add("You sicko. Why are you tampering with the "+item+"? Let the poor thing rest in peace.")
-                    return buffer.send()
-                                
-                # If the item is a regular item that already exists in the item directory
-                elif item in game.dungeon_items.keys():
-                    
-                    # If the item is actually a pile, then only take one thing from the pile
-                    if game.dungeon_items[item].isKind('pile'):
-                        thing = game.dungeon_items[item].take_one()
-                        if not thing == '' and thing in self.inventory:
-                            buffer.add('You already have '+addArticle(thing)+'. You decide not to be greedy.')
-                            return buffer.send()
-                        buffer.add(self.add_item(thing))
-                        return buffer.send()
-                    
-                    # If the item is locked (can't be taken until a condition is met)
-                    elif game.dungeon_items[item].isType('locked'):
-                        buffer.add("Try as you might, you just can't get the "+item+" free.")
-                        return buffer.send()
-                    
-                    # If the item is marked as immovable (can't be taken) 
-                    elif game.dungeon_items[item].isType('immovable'):
-                        buffer.add("You can't seem to move it. The "+item+" isn't going anywhere.")
-                        return buffer.send()
-                    
-                    # If the item is plural (ie. multiple exist), only one in the inventory at a time.
-                    # This covers duplicate items that aren't pulled from piles
-                    elif game.dungeon_items[item].isType('plural'):
-                        buffer.add(self.take_plural_item(item))
-                        return buffer.send()
-                    
-                    # If the item is a normal item 
-                    else:                    
-                        self.current_room.items.remove(item)
-                        buffer.add(self.add_item(item))
-                        return buffer.send()
+                message, moved = self.take_from_room(item)
+                if moved:
+                    self.current_room.items.remove(item)
+                buffer.add(message)
+                return buffer.send()
             
             # If the item is a valid item, but not necessarily in the room
-            elif item in game.dungeon_items.keys():
+            elif item in self.game.dungeon_items.keys():
 
                 for itm in self.current_room.items:
                     # Check if item is in a container
-                    if game.dungeon_items[itm].isKind('container') and game.dungeon_items[itm].isHolding(item):
-                        if game.dungeon_items[itm].isOpen():
-                            game.dungeon_items[itm].contents.remove(item)
+                    if self.game.dungeon_items[itm].isKind('container') and self.game.dungeon_items[itm].isHolding(item):
+                        if self.game.dungeon_items[itm].isOpen():
+                            self.game.dungeon_items[itm].contents.remove(item)
                             buffer.add(self.add_item(item))
                             return buffer.send()
                     
                     # Check if item is in a pile
-                    elif game.dungeon_items[itm].isKind('pile') and game.dungeon_items[itm].isHolding(item):
-                        if not game.dungeon_items[itm].isEmpty():
-                            thing = game.dungeon_items[itm].take_one()
+                    elif self.game.dungeon_items[itm].isKind('pile') and self.game.dungeon_items[itm].isHolding(item):
+                        if not self.game.dungeon_items[itm].isEmpty():
+                            thing = self.game.dungeon_items[itm].take_one()
                             if not thing == '' and thing in self.inventory:
                                 buffer.add('You already have '+addArticle(thing)+'. You decide not to be greedy.')
                                 return buffer.send()
@@ -1524,8 +2009,8 @@ class Player:
             # If the game.player taking from an unspecified pile, if take from the first pile in the room if it exists
             elif not re.search('pile',item) == None:
                 for itm in self.current_room.items:
-                    if game.dungeon_items[itm].isKind('pile') and not game.dungeon_items[itm].isEmpty():
-                        thing = game.dungeon_items[itm].take_one()
+                    if self.game.dungeon_items[itm].isKind('pile') and not self.game.dungeon_items[itm].isEmpty():
+                        thing = self.game.dungeon_items[itm].take_one()
                         if not thing == '' and thing in self.inventory:
                             buffer.add('You already have '+addArticle(thing)+'. You decide not to be greedy.')
                             return buffer.send()
@@ -1539,44 +2024,65 @@ class Player:
            
             # For items in the room description, but not interactive, or anything else that isn't listed or known
             else:
-                if re.search(item,self.current_room.short_description)==None and re.search(item,self.current_room.long_description)==None:
+                if not self.current_room.mentions(item):
                     buffer.add("You don't see "+addArticle(item)+" here.")                
                 else:
                     buffer.add("You can't take that.")                                
         return buffer.send()
 
+    # Leave an item from the inventory in the room (taking it out of the inventory is left to the caller)
+    def leave_in_room(self,item):
+        self.current_room.add_item(item)
+        if self.weapon==item:
+            self.weapon='fist'
+        if item in self.container_list:
+            self.container_list.remove(item)
+        return 'You drop the '+item+'.'
+
+    # Drop several things at once ('sword and key', 'all except lantern'). Anything in a container that's
+    # dropped stays in it, and the inventory is only updated once everything has been dropped.
+    def drop_items(self,nouns,exceptions=[]):
+        buffer = MessageBuffer()
+        visible = self.visible_items(['inventory','carried'])
+        if 'all' in nouns:
+            if len(self.inventory) == 0:
+                return "You don't have anything to drop"
+            names = list(self.inventory)
+        else:
+            names = [self.resolve_one(noun,['inventory','carried'],visible) for noun in nouns]
+        excluded = set([self.resolve_one(noun,['inventory','carried'],visible) for noun in exceptions])
+
+        dropped = set()
+        for name in names:
+            if name in excluded or name in dropped:
+                continue
+            if visible.get(name) == 'inventory':
+                dropped.add(name)
+                buffer.add(self.leave_in_room(name))
+            else:
+                message = self.drop_item(name)
+                buffer.add(message if not message == '' else "What "+name+"? You don't have any")
+        if len(dropped)>0:
+            self.inventory = [itm for itm in self.inventory if not itm in dropped]
+        if len(buffer.log) == 0:
+            return "You don't have anything else to drop"
+        return buffer.send()
+
     # Drop item from game.player inventory 
     def drop_item(self, item):
         buffer = MessageBuffer()
         if item=='all':            
-            if len(self.inventory)>0:
-                itmlist=[]
-                for itm in self.inventory:
-                    print(f'ITEMS: {itm}')
-                    itmlist.append(itm)                    
-                    if game.dungeon_items[itm].kind in ['container','lockbox'] and not game.dungeon_items[itm].isEmpty():
-                        itmlist = itmlist+game.dungeon_items[itm].contents
-                while not itmlist==[]:
-                    itm = itmlist.pop(0)
-                    buffer.add(self.drop_item(itm))
-            else:
-                buffer.add("You don't have anything to drop")
+            buffer.add(self.drop_items(['all']))
             
         elif item in self.inventory:
-            print('about to drop item')
             self.inventory.remove(item)
-            buffer.add(self.current_room.add_item(item))            
-            buffer.add('You drop the '+item+'.')
-            if self.weapon==item:
-                self.weapon='fist'
-            if item in self.container_list:
-                self.container_list.remove(item)
+            buffer.add(self.leave_in_room(item))
             
         
         elif len(self.container_list)>0:
             for thing in self.container_list:
-                if item in game.dungeon_items[thing].contents:
-                    buffer.add(game.dungeon_items[thing].remove_item(item))
+                if item in self.game.dungeon_items[thing].contents:
+                    buffer.add(self.game.dungeon_items[thing].remove_item(item))
             
         else:
             buffer.add("What "+item+"? You don't have any")
@@ -1590,15 +2096,15 @@ class Player:
         if self.has_item(item) and not item in self.inventory:
             if container == 'any':
                 for box in self.container_list:
-                    if game.dungeon_items[box].has_item(item):
-                        buffer.add(game.dungeon_items[box].remove_item(item))
+                    if self.game.dungeon_items[box].has_item(item):
+                        buffer.add(self.game.dungeon_items[box].remove_item(item))
                         self.inventory.append(item)
                         #buffer.add('You pull the '+item+' out of the '+box+'.')
                         return buffer.send()
             
             elif container in self.container_list:
-                if game.dungeon_items[container].has_item(item):
-                    buffer.add(game.dungeon_items[container].remove_item(item))
+                if self.game.dungeon_items[container].has_item(item):
+                    buffer.add(self.game.dungeon_items[container].remove_item(item))
                     self.inventory.append(item)
                     #buffer.add('You pull the '+item+' out of the '+container+'.')
                     return buffer.send()
@@ -1625,23 +2131,23 @@ class Player:
                 if self.has_item(item):
 
                     # Put the item in a container in the room
-                    if destination in self.current_room.items and game.dungeon_items[destination].kind in ['container','lockbox']:
+                    if destination in self.current_room.items and self.game.dungeon_items[destination].kind in ['container','lockbox']:
                         buffer.add(self.remove_item(item))
-                        game.dungeon_items[destination].contents.append(item)
+                        self.game.dungeon_items[destination].contents.append(item)
                         buffer.add('You put the '+item+' in the '+destination)
 
                     # Put the item in a container that the game.player is carrying
-                    elif destination in self.inventory and game.dungeon_items[destination].kind in ['container','lockbox']:
+                    elif destination in self.inventory and self.game.dungeon_items[destination].kind in ['container','lockbox']:
                         self.inventory.remove(item)
-                        game.dungeon_items[destination].contents.append(item)
+                        self.game.dungeon_items[destination].contents.append(item)
                         buffer.add('You put the '+item+' in the '+destination+' that you are carrying')
                     
                     # Return the item to a pile of its own kind
                     elif destination == 'pile' or not re.search('pile',destination) == None:
                         for itm in self.current_room.items:
-                            if game.dungeon_items[itm].isKind('pile'):
-                                if game.dungeon_items[itm].isHolding(item):
-                                    game.dungeon_items[itm].return_one()
+                            if self.game.dungeon_items[itm].isKind('pile'):
+                                if self.game.dungeon_items[itm].isHolding(item):
+                                    self.game.dungeon_items[itm].return_one()
                                     buffer.add('You put the '+item+' back in the pile of '+item+'s')
                                     buffer.add(self.remove_item(item))
                                     return buffer.send()
@@ -1655,29 +2161,201 @@ class Player:
         buffer.add("You don't have the "+item)
         return buffer.send()
 
+    # Put several things in the same place ('put rock, bone in bottle', 'put all in sack')
+    def put_items(self,nouns,exceptions=[],destination='room'):
+        buffer = MessageBuffer()
+        visible = self.visible_items(['inventory','carried'])
+        if 'all' in nouns:
+            names = [itm for itm in self.inventory if not itm == destination]
+            if len(names) == 0:
+                return "You don't have anything to put there"
+        else:
+            names = [self.resolve_one(noun,['inventory','carried'],visible) for noun in nouns]
+        excluded = set([self.resolve_one(noun,['inventory','carried'],visible) for noun in exceptions])
+        for name in names:
+            if not name in excluded:
+                buffer.add(self.put_item(name,destination))
+        if len(buffer.log) == 0:
+            return "You don't have anything else to put there"
+        return buffer.send()
+
     # When the game.player dies, show death message and then ask if they want to play again
     def death(self,msg):
         buffer = MessageBuffer()
         buffer.add(msg)
         return buffer.send()
     
-# Initialize Global Monster Directory
-def load_dungeon(filename='rooms.txt'):
-    roomlist = {}
+# ======================================================================================
+# REGISTRY - A lazy directory of rooms, items, or monsters. Only the names are known up
+#            front; each object is built from its data file the first time it is looked up.
+# ======================================================================================
+class Registry(MutableMapping):
+    def __init__(self,game=None):
+        self.game = game            # the Console every object in the registry belongs to
+        self.classes = {}           # name -> class the object is built from
+        self.loaded = {}            # name -> object that has already been built
+        self.touched = set()        # names looked up since the last reset (the only ones that can have changed)
+        self.lock = threading.RLock()
+
+    # Add a name to the directory along with the class that will build it
+    def register(self,name,cls):
+        self.classes[name] = cls
+
+    # Build an object unless it has been built already
+    def load(self,name):
+        obj = self.loaded.get(name)
+        if obj is None:
+            with self.lock:
+                obj = self.loaded.get(name)
+                if obj is None:
+                    obj = self.classes[name].from_template(name,self.game)
+                    self.loaded[name] = obj
+        return obj
+
+    # Look up an object, building it on first use. Anything handed out may get changed, so mark it for the next reset.
+    def __getitem__(self,name):
+        obj = self.load(name)
+        self.touched.add(name)
+        return obj
+
+    def __setitem__(self,name,obj):
+        self.loaded[name] = obj
+        self.touched.add(name)
+        if not name in self.classes:
+            self.classes[name] = type(obj)
+
+    def __delitem__(self,name):
+        del self.classes[name]
+        self.loaded.pop(name,None)
+
+    # Membership and iteration only look at the names, so they never load anything
+    def __contains__(self,name):
+        return name in self.classes
+
+    def __iter__(self):
+        return iter(self.classes)
+
+    def __len__(self):
+        return len(self.classes)
+
+    # Check if an object has been built yet
+    def is_loaded(self,name):
+        return name in self.loaded
+
+    # Build the named objects now (unknown names are ignored)
+    def prefetch(self,names):
+        for name in names:
+            if name in self.classes:
+                self.load(name)
+
+    # Build the templates for the named objects without building the objects (unknown names are ignored)
+    def prefetch_templates(self,names):
+        for name in names:
+            cls = self.classes.get(name)
+            if not cls == None:
+                get_template(cls,name)
+
+    # Build the template of every object in the directory (without building the objects), so that
+    # games started later (or in processes forked later) share them instead of reading the data files
+    def build_templates(self):
+        self.prefetch_templates(list(self.classes))
+        return len(self.classes)
+
+    # Put every object that was looked up since the last reset back to its starting state
+    def reset(self):
+        touched = list(self.touched)
+        self.touched.clear()
+        for name in touched:
+            if name in self.loaded:
+                self.loaded[name].reset()
+        return len(touched)
+
+# Build the templates for the rooms next to a room (and whatever is in them) on a background thread.
+# Only the shared templates are built, never the game's own objects, so the thread can't race the game:
+# the objects are made from the templates (which is quick) when the player first looks them up.
+def prefetch_neighbours(room):
+    game = room.game
+    rooms = game.dungeon_rooms
+    def task(names):
+        for name in names:
+            template = get_template(rooms.classes[name],name)
+            game.dungeon_items.prefetch_templates(template.fields.get('items',[]))
+            game.monsters.prefetch_templates(template.fields.get('npcs',[]))
+        # Keep what was parsed, even if no other game saves the cache after this
+        world_cache.save()
+    names = [name for name in room.map.values() if name in rooms and not rooms.is_loaded(name)]
+    if len(names)>0:
+        threading.Thread(target=task,args=(names,),daemon=True).start()
+
+# The settings from config.txt, for code that needs them without building a game
+class Settings:
+    pass
+
+# Read the settings and command list from config.txt onto settings (a new Settings if none is given).
+# A Console reads them onto itself.
+def load_config(settings=None):
+    if settings == None:
+        settings = Settings()
+    try:
+        lines = open(resource_path('config.txt'),'r')
+
+        for line in lines:
+            if not line.startswith('#') and not line=='\n':  # Ignore comments and empty lines
+                key, value = line.split('=')
+                match key:
+                    case 'new_commands':
+                        # Each command is a verb followed by its aliases, separated by '|' (e.g. attack|fight|hit|kill)
+                        raw_cmds = value.strip().split(',')
+                        settings.command_groups = []
+                        for itm in raw_cmds:
+                            if len(itm.strip())>0:
+                                settings.command_groups.append(itm.strip().split('|'))
+                    case 'directions'|'commands':
+                        setattr(settings,key.strip(),value.strip().split(','))   
+                    case 'stopwords'|'quantifiers':
+                        setattr(settings,key.strip(),[word.strip() for word in value.split(',') if len(word.strip())>0])
+                    case 'abbreviations'|'synonyms':
+                        # Each entry is a word or phrase and what it stands for (e.g. n:north,pick up:take)
+                        table = {}
+                        for entry in value.split(','):
+                            if ':' in entry:
+                                word, meaning = entry.split(':',1)
+                                table[word.strip()] = meaning.strip()
+                        setattr(settings,key.strip(),table)
+                    case 'fontsize'|'displayfontsize'|'titlefontsize'|'loader_workers'|'server_port'|'server_max_connections'|'server_idle_timeout'|'server_drain_timeout'|'server_max_line'|'server_workers'|'history_size':
+                        setattr(settings, key.strip(),int(value))
+                    case _:                        
+                        setattr(settings, key.strip(),value.strip()) 
+    except:
+        print('File read error: console.txt does not exist')    
+    return settings
+
+# Build the template of every room, item and monster, so that games started later (or in processes
+# forked later) share them instead of reading the data files
+def build_templates():
+    count = 0
+    for registry in [load_itemlist(),load_dungeon(),load_monsterlist()]:
+        count += registry.build_templates()
+    world_cache.save()
+    return count
+
+# Initialize Global Room Directory
+def load_dungeon(filename='rooms.txt',game=None):
+    roomlist = Registry(game)
     filepath = os.path.join('data',filename)
-    lines = open(resource_path(filepath),'r')
+    lines = read_lines(filepath,resource_path(filepath))
     
     for line in lines:
         name = line.strip()
-        roomlist[name]=Room(name)
+        roomlist.register(name,Room)
     
     return roomlist
 
 # Initialize Global Item Directory
-def load_itemlist(filename='items.txt'):
-    itemlist = {}
+def load_itemlist(filename='items.txt',game=None):
+    itemlist = Registry(game)
     filepath = os.path.join('data',filename)
-    lines = open(resource_path(filepath),'r')
+    lines = read_lines(filepath,resource_path(filepath))
     
     for line in lines:
         name = line.strip()        
@@ -1685,30 +2363,31 @@ def load_itemlist(filename='items.txt'):
         key,itmType = keyname.split('|')        
         match itmType:
             case 'lockbox':
-                itemlist[key]=Lockbox(key)
+                itmClass = Lockbox
             case 'container':
-                itemlist[key]=Container(key)
+                itmClass = Container
             case 'weapon':
-                itemlist[key]=Weapon(key)
+                itmClass = Weapon
             case 'pile':
-                itemlist[key]=Pile(key)
+                itmClass = Pile
             case 'door':
-                itemlist[key]=Door(key)
+                itmClass = Door
             case _:
-                itemlist[key]=Item(key)
+                itmClass = Item
+        itemlist.register(key,itmClass)
     
     return itemlist
 
 # Initialize Global Monster Directory
-def load_monsterlist(filename='monsters.txt'):
-    monsterlist = {}
+def load_monsterlist(filename='monsters.txt',game=None):
+    monsterlist = Registry(game)
     filepath = os.path.join('data',filename)
     
-    lines = open(resource_path(filepath),'r')
+    lines = read_lines(filepath,resource_path(filepath))
     
     for line in lines:
         name = line.strip()
-        monsterlist[name]=Monster(name)
+        monsterlist.register(name,Monster)
     
     return monsterlist
 
@@ -1716,449 +2395,1095 @@ def load_monsterlist(filename='monsters.txt'):
 def load_dialog(name='dialog'):
     return DialogManager(name)
 
-class Console:
+# List every room, item, monster, and dialog data file as (name, path, parser name) jobs
+def world_files():
+    jobs = []
+    for filename, dataclass in [('items.txt',Item),('rooms.txt',Room),('monsters.txt',Monster),('dialog.txt',DialogFile)]:
+        register_parser(dataclass.__name__,dataclass.read_fields)
+        filepath = os.path.join('data',filename)
+        for line in read_lines(filepath,resource_path(filepath)):
+            line = line.strip()
+            if len(line)==0 or line.startswith('#'):
+                continue
+            match filename:
+                case 'items.txt':
+                    name = line.replace('_',' ').split('|')[0]
+                case 'dialog.txt':
+                    name = line.split('=')[1].strip()
+                case _:
+                    name = line
+            datafile = dataclass.data_file(name)
+            jobs.append((datafile,resource_path(datafile),dataclass.__name__))
+    return jobs
+
+# Parse every data file that isn't already in the world cache across a pool of worker
+# threads (or processes), then store the results in the cache in a fixed order
+def preload_world(workers=4,pool='thread'):
+    from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+    jobs = [job for job in world_files() if world_cache.is_stale(job[0],job[1])]
+    if len(jobs)==0:
+        return 0
+    # Worker processes are forked so they inherit the loaded modules (and registered parsers) as-is.
+    # Platforms that can't fork (Windows) fall back to threads.
+    import multiprocessing
+    if pool == 'process' and 'fork' in multiprocessing.get_all_start_methods():
+        executor = ProcessPoolExecutor(max_workers=workers,mp_context=multiprocessing.get_context('fork'))
+    else:
+        executor = ThreadPoolExecutor(max_workers=workers)
+    with executor:
+        chunksize = max(1,len(jobs)//(workers*4))
+        results = executor.map(parse_file,*zip(*jobs),chunksize=chunksize)
+        for job, result in zip(jobs,results):
+            world_cache.store(job[0],*result)
+    return len(jobs)
+
+# ==========================================================================================
+# LEXICON - How typed commands are tidied up before they're handled: words to drop (like
+#           'the'), phrases to drop (like 'a piece of'), and words or phrases to replace
+#           (like 'n' -> 'north'). All of it comes from config.txt and is compiled into two
+#           dictionaries, so a command is normalized in one pass over its words.
+# ==========================================================================================
+class Lexicon:
+    def __init__(self,stopwords=[],quantifiers=[],synonyms={}):
+        self.words = {}             # word -> list of words to put in its place (empty to drop it)
+        self.phrases = {}           # first word -> [(words in the phrase, words to put in its place)], longest first
+        for word in stopwords:
+            self.add(word,'')
+        for phrase in quantifiers:
+            self.add(phrase,'')
+        for phrase, replacement in synonyms.items():
+            self.add(phrase,replacement)
+        for options in self.phrases.values():
+            options.sort(key=lambda option: -len(option[0]))
+
+    def add(self,phrase,replacement):
+        words = phrase.lower().split()
+        if len(words) == 0:
+            return
+        replacement = replacement.split()
+        if len(words) == 1:
+            self.words[words[0]] = replacement
+        else:
+            self.phrases.setdefault(words[0],[]).append((words,replacement))
+
+    # Split a command into words, dropping and replacing words and phrases as it goes
+    def normalize(self,text):
+        words = text.split()
+        lowered = text.lower().split()
+        result = []
+        i = 0
+        while i < len(words):
+            key = lowered[i]
+            for phrase, replacement in self.phrases.get(key,[]):
+                if lowered[i:i+len(phrase)] == phrase:
+                    result += replacement
+                    i += len(phrase)
+                    break
+            else:
+                if key in self.words:
+                    result += self.words[key]
+                else:
+                    result.append(words[i])
+                i += 1
+        return result
+
+# ==========================================================================================
+# TRIGGERS - The commands a room reacts to before they're handled as usual: the solutions to
+#            its puzzle, and the scripts to run when particular items are taken (on_take_<item>).
+#            They're put through the lexicon into the same canonical form as what the player
+#            types (see Console.canonical) when the room is first used, so 'use the large key'
+#            finds the solution 'use large key', and checking a command is one dictionary lookup.
+# ==========================================================================================
+class TriggerIndex:
+    def __init__(self,room):
+        game = room.game
+        self.game = game
+        self.template = vars(room).get('template')      # what the index was built from, to tell when it's out of date
+        self.solution = room.solution if room.has_field('solution') else None
+        self.solutions = {}         # canonical command -> the solution as written (after the lexicon)
+        self.takes = {}             # canonical item name -> compiled script to run when it's taken
+        if not self.solution == None:
+            for solution in self.solution:
+                words = game.lexicon.normalize(solution)
+                if len(words)>0:
+                    self.solutions.setdefault(game.canonical(words),' '.join(words))
+        if room.has_field('on_take'):
+            keys = set(vars(room))
+            if not self.template == None:
+                keys.update(self.template.fields)
+            for key in keys:
+                if key.startswith('on_take_'):
+                    self.takes[self.item_key(game,key[len('on_take_'):])] = compile_script(getattr(room,key))
+
+    # The canonical form of an item's name ('large_key' and 'the large key' are both 'large key')
+    @staticmethod
+    def item_key(game,name):
+        return ' '.join(game.lexicon.normalize(name.replace('_',' '))).lower()
+
+    # The script to run when an item is taken (None if there isn't one)
+    def take_script(self,item):
+        if len(self.takes) == 0:
+            return None
+        return self.takes.get(self.item_key(self.game,item))
+
+# ==========================================================================================
+# VERBS - A directory of every command word. Each verb (like 'attack') and its aliases
+#         ('fight', 'hit', 'kill') map straight to the function that handles them.
+# ==========================================================================================
+class Verb:
+    def __init__(self,name,handler,aliases):
+        self.name = name
+        self.handler = handler      # called with (word used, rest of the words) and returns the output
+        self.aliases = aliases
+
+class VerbRegistry:
     def __init__(self):
-        self.log = []
+        self.verbs = {}             # verb name -> Verb
+        self.words = {}             # verb name or alias -> Verb
+
+    # Add a verb (replacing any verb already using one of its words)
+    def register(self,name,handler,aliases=[]):
+        verb = Verb(name,handler,list(aliases))
+        for word in [name]+verb.aliases:
+            self.release(word)
+        self.verbs[name] = verb
+        for word in [name]+verb.aliases:
+            self.words[word] = verb
+        return verb
+
+    # Add another word for an existing verb
+    def alias(self,name,word):
+        verb = self.verbs[name]
+        self.release(word)
+        verb.aliases.append(word)
+        self.words[word] = verb
+
+    # Take a word away from the verb using it. A verb left with no words reaching it is dropped.
+    def release(self,word):
+        old = self.words.pop(word,None)
+        if old == None:
+            return
+        if word in old.aliases:
+            old.aliases.remove(word)
+        if not old.name in self.words and len(old.aliases) == 0 and self.verbs.get(old.name) is old:
+            del self.verbs[old.name]
+
+    # Find the verb for a command word (None if there isn't one)
+    def lookup(self,word):
+        return self.words.get(word)
+
+    def __contains__(self,word):
+        return word in self.words
+
+    # Every verb and alias in alphabetical order
+    def all_words(self):
+        return sorted(self.words)
+
+    # Describe the whole command table as verb -> (aliases, name of the handler)
+    def table(self):
+        table = {}
+        for name, verb in self.verbs.items():
+            handler = None if verb.handler == None else verb.handler.__name__
+            table[name] = (list(verb.aliases),handler)
+        return table
+
+# ==========================================================================================
+# COMPLETION - Finishing off a half-typed command (for Tab in the front ends). The verbs
+#              and the names the player can use right now (what's visible, the monsters
+#              in the room, and the exits) are kept in prefix tries. The names are only
+#              updated when the game has changed, and then only the ones that came or went.
+#              Each command only offers the kinds of names that make sense after it.
+# ==========================================================================================
+class TrieNode:
+    def __init__(self):
+        self.children = {}          # next letter -> TrieNode
+        self.ends = 0               # how many times a word ending here was added
+        self.size = 0               # how many words (counting repeats) end here or below
+
+class PrefixTrie:
+    def __init__(self,words=[]):
+        self.root = TrieNode()
+        for word in words:
+            self.add(word)
+
+    def add(self,word):
+        node = self.root
+        node.size += 1
+        for letter in word:
+            node = node.children.setdefault(letter,TrieNode())
+            node.size += 1
+        node.ends += 1
+
+    # Remove one copy of a word (branches with nothing left in them are dropped)
+    def remove(self,word):
+        if not word in self:
+            return
+        node = self.root
+        node.size -= 1
+        for letter in word:
+            child = node.children[letter]
+            child.size -= 1
+            if child.size == 0:
+                del node.children[letter]
+                return
+            node = child
+        node.ends -= 1
+
+    def find(self,prefix):
+        node = self.root
+        for letter in prefix:
+            node = node.children.get(letter)
+            if node == None:
+                return None
+        return node
+
+    def __contains__(self,word):
+        node = self.find(word)
+        return not node == None and node.ends > 0
+
+    # Every word starting with prefix in alphabetical order (at most limit of them)
+    def complete(self,prefix,limit=20):
+        node = self.find(prefix)
+        words = []
+        if node == None:
+            return words
+        stack = [(prefix,node)]
+        while len(stack)>0 and len(words)<limit:
+            word, node = stack.pop()
+            if node.ends > 0:
+                words.append(word)
+            for letter in sorted(node.children,reverse=True):
+                stack.append((word+letter,node.children[letter]))
+        return words
+
+# The kinds of names that can follow a command (by the method that handles it). Commands that
+# aren't listed here (like look) can be followed by any of them.
+NAME_KINDS = ['items','monsters','exits']
+COMPLETION_KINDS = {
+    'verb_go':['exits'],
+    'verb_take':['items'], 'verb_drop':['items'], 'verb_put':['items'], 'verb_add':['items'],
+    'verb_remove':['items'], 'verb_eat':['items'], 'verb_drink':['items'], 'verb_use':['items'],
+    'verb_open':['items'], 'verb_close':['items'], 'verb_lock':['items'], 'verb_unlock':['items'],
+    'verb_light':['items'], 'verb_read':['items'],
+    'verb_attack':['monsters'], 'verb_kick':['monsters'], 'verb_punch':['monsters'],
+    'verb_talk':['monsters'], 'verb_ask':['monsters'], 'verb_kiss':['monsters','items'],
+}
+
+# Where the name being typed starts: after a preposition ('put rock in b') or in a list ('take sword and k')
+COMPLETION_BREAK = re.compile(r'.*(?:\s(?:in|from|to|and|except|but)\s+|,\s*)')
+
+class Completer:
+    def __init__(self,game):
+        self.game = game
+        self.verbs = PrefixTrie(game.verbs.all_words())
+        self.tries = {}             # kind of name -> PrefixTrie of those names
+        self.names = {}             # kind of name -> the names in its trie
+        for kind in NAME_KINDS:
+            self.tries[kind] = PrefixTrie()
+            self.names[kind] = set()
+        self.version = None         # the game's state version when the names were last updated
+
+    # The names the player can use right now, by kind
+    def current_names(self):
+        player = self.game.player
+        room = player.current_room
+        return {'items':set(player.visible_items()),'monsters':set(room.npcs),'exits':set(room.map.keys())}
+
+    # Bring the name tries up to date, adding and removing only the names that changed
+    def update(self):
+        if self.version == self.game.state_version:
+            return
+        self.version = self.game.state_version
+        current = self.current_names()
+        for kind, names in current.items():
+            trie = self.tries[kind]
+            for name in self.names[kind] - names:
+                trie.remove(name)
+            for name in names - self.names[kind]:
+                trie.add(name)
+            self.names[kind] = names
+
+    # The kinds of names that can follow a command word
+    def kinds(self,word):
+        verb = self.game.verbs.lookup(word)
+        if verb == None or verb.handler == None:
+            return NAME_KINDS
+        return COMPLETION_KINDS.get(verb.handler.__name__,NAME_KINDS)
+
+    # Every way the line could be finished: a verb if there's only one word so far, otherwise a name
+    # that can follow the verb (the one after a preposition or in a list, if there is one)
+    def complete(self,text,limit=20):
+        text = text.lower().lstrip()
+        if not ' ' in text:
+            return self.verbs.complete(text,limit)
+        self.update()
+        verb, rest = text.split(' ',1)
+        rest = rest.lstrip()
+        found = COMPLETION_BREAK.match(rest)
+        if not found == None:
+            rest = rest[found.end():]
+        if rest.startswith('the '):
+            rest = rest[4:]
+        names = set()
+        for kind in self.kinds(verb):
+            names.update(self.tries[kind].complete(rest,limit))
+        return [text[:len(text)-len(rest)]+name for name in sorted(names)[:limit]]
+
+    # Extend the line as far as all the completions agree (adding a space after a single match)
+    def complete_line(self,text):
+        options = self.complete(text)
+        if len(options) == 0:
+            return text, options
+        if len(options) == 1:
+            return options[0]+' ', options
+        return os.path.commonprefix(options), options
+
+# ==========================================================================================
+# SPELLING - Suggestions for commands that weren't recognized ('atack python' -> 'attack
+#            python'). The verbs and the names of every item and monster are kept in
+#            BK-trees, which only compare a misspelled word against the few words that
+#            could be close enough instead of against every word in the game.
+# ==========================================================================================
+# Number of single letter insertions, deletions, and substitutions needed to turn one word into another.
+# The columns of the usual table are worked out all at once as the bits of an integer (Myers' method),
+# so it only loops over the letters of b.
+def edit_distance(a,b):
+    if len(a) == 0 or len(b) == 0:
+        return len(a)+len(b)
+    positions = {}
+    for i, letter in enumerate(a):
+        positions[letter] = positions.get(letter,0) | (1<<i)
+    full = (1<<len(a))-1
+    last = 1<<(len(a)-1)
+    up, down = full, 0
+    distance = len(a)
+    for letter in b:
+        match = positions.get(letter,0)
+        xv = match | down
+        xh = (((match & up) + up) ^ up) | match
+        hup = down | (~(xh | up) & full)
+        hdown = up & xh
+        if hup & last:
+            distance += 1
+        elif hdown & last:
+            distance -= 1
+        hup = ((hup << 1) | 1) & full
+        hdown = (hdown << 1) & full
+        up = hdown | (~(xv | hup) & full)
+        down = hup & xv
+    return distance
+
+# Same as edit_distance, but swapping two letters next to each other ('tkae' -> 'take') only counts once
+def typo_distance(a,b):
+    rows = [list(range(len(b)+1))]
+    for i in range(1,len(a)+1):
+        row = [i]
+        for j in range(1,len(b)+1):
+            cost = 0 if a[i-1] == b[j-1] else 1
+            value = min(rows[i-1][j]+1,row[j-1]+1,rows[i-1][j-1]+cost)
+            if i>1 and j>1 and a[i-1] == b[j-2] and a[i-2] == b[j-1]:
+                value = min(value,rows[i-2][j-2]+1)
+            row.append(value)
+        rows.append(row)
+    return rows[-1][-1]
+
+# How far off a word of this length can be and still get a suggestion
+def max_typos(word):
+    if len(word) < 3:
+        return 0
+    if len(word) == 3:
+        return 1
+    return 2
+
+class BKTree:
+    def __init__(self,words=[]):
+        self.root = None            # [word, {distance: child node}]
+        self.words = set()
+        for word in words:
+            self.add(word)
+
+    def add(self,word):
+        if word in self.words:
+            return
+        self.words.add(word)
+        if self.root == None:
+            self.root = [word,{}]
+            return
+        node = self.root
+        while True:
+            distance = edit_distance(word,node[0])
+            child = node[1].get(distance)
+            if child == None:
+                node[1][distance] = [word,{}]
+                return
+            node = child
+
+    # Every word within max_distance of word
+    def search(self,word,max_distance):
+        found = []
+        if self.root == None:
+            return found
+        stack = [self.root]
+        while len(stack)>0:
+            node = stack.pop()
+            distance = edit_distance(word,node[0])
+            if distance <= max_distance:
+                found.append(node[0])
+            for d, child in node[1].items():
+                if distance-max_distance <= d <= distance+max_distance:
+                    stack.append(child)
+        return found
+
+    # The closest word (counting swapped letters as one typo), or None if nothing is close enough
+    def closest(self,word,max_distance):
+        found = self.search(word,max_distance)
+        if len(found) == 0:
+            return None
+        return min(found,key=lambda match: (typo_distance(word,match),edit_distance(word,match),match))
+
+class Speller:
+    def __init__(self,game):
+        self.game = game
+        self.verbs = BKTree()
+        self.names = BKTree()
+        self.sizes = None           # registry sizes when the names were last added
+
+    # Add any verbs and names that are new since last time (names are only ever added)
+    def update(self):
+        registries = [self.game.dungeon_items,self.game.monsters]
+        sizes = (len(self.game.verbs.words),)+tuple(len(registry) for registry in registries)
+        if sizes == self.sizes:
+            return
+        self.sizes = sizes
+        for word in self.game.verbs.words:
+            self.verbs.add(word)
+        for registry in registries:
+            for name in registry:
+                self.names.add(name)
+
+    # Suggest a command that was probably meant (None if there's nothing close)
+    def suggest(self,words):
+        self.update()
+        if len(words) == 0:
+            return None
+        verb = words[0].lower()
+        if not verb in self.verbs.words:
+            verb = self.verbs.closest(verb,max_typos(verb))
+            if verb == None:
+                return None
+        noun = " ".join(words[1:])
+        if len(noun)>0 and not noun in self.names.words:
+            match = self.names.closest(noun,max_typos(noun))
+            if not match == None:
+                noun = match
+        suggestion = (verb+' '+noun).strip()
+        if suggestion == " ".join(words):
+            return None
+        return suggestion
+
+# ==========================================================================================
+# BATCHES - The result of each command in a batch (a replayed or scripted session), along
+#           with what the command did to the game: 'ok', 'error' (not a command), 'quit',
+#           'died' (the player was killed), or 'end' (the game was won)
+# ==========================================================================================
+GAME_OVER = ['quit','died','end']
+
+# Work out what a command's output means for the game. The [DIED] marker can come anywhere in the
+# output (the player's own move is reported before the fight that kills them).
+def command_status(output):
+    if output == 'quit':
+        return 'quit'
+    if '[DIED]' in output:
+        return 'died'
+    if '[END]' in output:
+        return 'end'
+    if output.startswith('ERROR: '):
+        return 'error'
+    return 'ok'
+
+class CommandResult:
+    def __init__(self,command,output):
+        self.command = command
+        self.output = output
+        self.status = command_status(output)
+
+    # True if the game is over after this command
+    def is_over(self):
+        return self.status in GAME_OVER
+
+    # The output as the player sees it (without the [DIED] marker)
+    def text(self):
+        if self.status == 'died':
+            return self.output.replace('[DIED]','')
+        return self.output
+
+    def lines(self):
+        return self.text().split('\n')
+
+# Put a batch of results together the way the console shows them (each command after a '>>' prompt)
+def transcript(results):
+    parts = []
+    for result in results:
+        parts.append('\n>> '+result.command+'\n'+result.text())
+    return '\n'.join(parts)
+
+class Console:
+    # The method that handles each command word. config.txt decides which of these words are
+    # turned on and which of them are aliases of each other.
+    verb_methods = {
+        'about':'verb_about', 'help':'verb_help', 'commands':'verb_commands', 'stuck':'verb_stuck',
+        'hint':'verb_hint', 'stats':'verb_stats', 'inventory':'verb_inventory', 'inv':'verb_inventory',
+        'quit':'verb_quit', 'exit':'verb_quit', 'exits':'verb_exits', 'go':'verb_go', 'move':'verb_go',
+        'n':'verb_direction', 's':'verb_direction', 'e':'verb_direction', 'w':'verb_direction',
+        'north':'verb_direction', 'south':'verb_direction', 'east':'verb_direction', 'west':'verb_direction',
+        'up':'verb_direction', 'down':'verb_direction', 'jump':'verb_jump', 'crouch':'verb_jump',
+        'ask':'verb_ask', 'say':'verb_say', 'talk':'verb_talk', 'kiss':'verb_kiss',
+        'attack':'verb_attack', 'hit':'verb_attack', 'fight':'verb_attack', 'kill':'verb_attack',
+        'kick':'verb_kick', 'punch':'verb_punch', 'look':'verb_look', 'examine':'verb_look',
+        'listen':'verb_listen', 'smell':'verb_smell', 'search':'verb_search', 'light':'verb_light',
+        'read':'verb_read', 'get':'verb_take', 'take':'verb_take', 'drop':'verb_drop', 'leave':'verb_drop',
+        'put':'verb_put', 'place':'verb_put', 'add':'verb_add', 'remove':'verb_remove', 'eat':'verb_eat',
+        'drink':'verb_drink', 'use':'verb_use', 'open':'verb_open', 'close':'verb_close',
+        'unlock':'verb_unlock', 'lock':'verb_lock',
+    }
+
+    # Commands that only show part of the game without changing it, so their output can be kept
+    # until something changes (look only counts when it's on its own; looking at things can be random).
+    # The memo keeps the memo_size most recently used outputs.
+    memo_methods = ['verb_about','verb_help','verb_commands','verb_stuck','verb_hint','verb_stats','verb_inventory','verb_exits','verb_look']
+    memo_size = 64
+
+    # Every Console is a separate game with its own copy of the world. rng is the random number
+    # generator it uses (each game gets its own if none is given).
+    def __init__(self,rng=None):
+        self.rng = random.Random() if rng == None else rng
+        # Held while a command runs, so a game can be driven from any thread. Background threads (room
+        # prefetch, the hot-reload watcher) never touch a game's objects, only the shared templates.
+        self.lock = threading.RLock()
+        self.state_version = 0          # goes up every time anything in the game changes
+        self.memo = OrderedDict()       # command -> (state version, output) for the commands in memo_methods, least recently used first
+        self.memo_hits = 0
+        self.memo_misses = 0
         
         self.directions = ['north','west','south','east','n','w','e','s']
-        self.commands = self.directions+ ['about','ask','help','move','look','examine','take','get','drop','leave','eat','drink','inventory','quit','hint','stats','stuck','listen','smell','kick','punch','open','close','lock','unlock','talk','light','use']
+        self.command_groups = [[word] for word in ['about','ask','help','move','look','examine','take','get','drop','leave','eat','drink','inventory','quit','hint','stats','stuck','listen','smell','kick','punch','open','close','lock','unlock','talk','light','use']]
+        self.prefetch = 'false'
+        self.loader = 'serial'
+        self.loader_pool = 'thread'
+        self.loader_workers = 4
+        self.hot_reload = 'false'
+        self.check_world = 'false'
+        self.history_size = 1000
+        self.history_file = ''
+        self.stopwords = ['the']
+        self.quantifiers = ['a piece of','some']
+        self.abbreviations = {}
+        self.synonyms = {}
+        self.command_separator = ';'
+        self.load_config()
+        self.lexicon = Lexicon(self.stopwords,self.quantifiers,self.abbreviations|self.synonyms)
+        self.game_id = new_game_id()
+        self.log = History(self.history_size,self.transcript_file())
+        self.verbs = self.load_verbs()
+        self.commands = self.verbs.all_words()
+        self.completer = None
+        self.speller = None
+
+        # The parallel loader parses all the data files up front, then builds every object from the cache
+        if self.loader == 'parallel':
+            preload_world(self.loader_workers,self.loader_pool)
         
-        self.dungeon_items=load_itemlist()
-        self.dungeon_rooms=load_dungeon()
-        self.monsters=load_monsterlist()
+        self.dungeon_items=load_itemlist(game=self)
+        self.dungeon_rooms=load_dungeon(game=self)
+        self.monsters=load_monsterlist(game=self)
         self.voices=load_dialog()
-        self.player = Player()
+        self.nouns = NounIndex(self.dungeon_items)
+        if self.loader == 'parallel':
+            for registry in [self.dungeon_items,self.dungeon_rooms,self.monsters]:
+                registry.prefetch(registry)
+        if self.check_world == 'true':
+            from worldcheck import check_world
+            for problem in check_world(self):
+                print(f'World check: {problem}')
+        world_cache.save()
+        self.player = Player(self)
         self.game_won = False
-        
-        try:
-            lines = open(resource_path('config.txt'),'r')
-
-            for line in lines:
-                if not line.startswith('#') and not line=='\n':  # Ignore comments and empty lines
-                    key, value = line.split('=')
-                    match key:
-                        case 'new_commands':
-                            raw_cmds = value.strip().split(',')
-                            all_cmds = []
-                            for itm in raw_cmds:
-                                if len(itm.strip())>0:
-                                    if itm.find('|')>-1:
-                                        all_cmds = all_cmds+itm.strip().split('|')
-                                    else:
-                                        all_cmds.append(itm)
-                            setattr(self,key.strip(),all_cmds)   
-                        case 'directions'|'commands':
-                            setattr(self,key.strip(),value.strip().split(','))   
-                        case 'fontsize'|'displayfontsize'|'titlefontsize':
-                            setattr(self, key.strip(),int(value))
-                        case _:                        
-                            setattr(self, key.strip(),value.strip()) 
-            self.commands = self.new_commands + self.directions
-            self.commands.sort()
-        except:
-            print('File read error: console.txt does not exist')    
 
+        # Watch the data files for edits and swap in the new versions between commands
+        self.template_generation = template_generation
+        if self.hot_reload == 'true':
+            start_watcher()
+
+    # Read the console settings and command list from config.txt
+    def load_config(self):
+        load_config(self)
+
+    # Build the verb registry from the command groups in config.txt (plus the directions). Each group
+    # becomes one verb, handled by the method for the first of its words that has one.
+    def load_verbs(self):
+        verbs = VerbRegistry()
+        for group in self.command_groups+[[direction] for direction in self.directions]:
+            handler = None
+            for word in group:
+                if word in self.verb_methods:
+                    handler = getattr(self,self.verb_methods[word])
+                    break
+            verbs.register(group[0],handler,group[1:])
+        return verbs
+
+    # The last num commands, newest first, one per line
     def get(self,num=25):
-        logsize = len(self.log)        
-        msg = ''
-        start = 0
-        end = logsize
-        
-        if logsize>num:
-            start = logsize-num 
-            
-        for cmd in self.log[start:end]:
-            msg = msg +cmd+"\n"
-
-        return msg  
+        commands = self.log.last(num)
+        if len(commands) == 0:
+            return ''
+        return '\n'.join(commands)+'\n'
     
+    # The last num lines of a list of output lines
     def get_output(self,buffer,num=25):
-        logsize = len(buffer)
-        msg = []
-        start = 0
-        end = logsize
-        
-        if logsize>num:
-            start = logsize-num 
-            
-        for cmd in buffer[start:end]:
-            msg.append(cmd)
-
-        return msg  
+        return buffer[max(0,len(buffer)-num):]
 
     def add(self,msg):
-        self.log.insert(0,msg)
+        self.log.add(msg)
+
+    # The file this game's transcript goes to (history_file with {game} replaced by the game's id)
+    def transcript_file(self):
+        return self.history_file.replace('{game}',self.game_id)
+
+    # Finish with the game (closes its transcript file)
+    def finish(self):
+        self.log.close()
     
     def handle(self,msg):
+        with self.lock:
+            self.apply_reloads()
+            logged = []
+            output = self.run_command(msg,logged)
+            for cmd in logged:
+                self.add(cmd)
+            return output
+
+    # Run a list of commands (like a saved session or a test script) one after another and return
+    # a CommandResult for each. Edited data files are only swapped in once, before the batch, and the
+    # commands are added to the log all at once at the end. Unless stop is False, the batch stops
+    # at the first command that ends the game (and the commands after it aren't run).
+    def handle_many(self,commands,stop=True):
+        with self.lock:
+            self.apply_reloads()
+            logged = []
+            results = []
+            for msg in commands:
+                msg = msg.rstrip('\r\n')
+                result = CommandResult(msg,self.run_command(msg,logged))
+                results.append(result)
+                if stop and result.is_over():
+                    break
+            self.log.extend(logged)
+            return results
+
+    # Split a line into the commands chained on it ('n; take sword; e'). A line with no commands on it
+    # is left as it is, so it gets the same answer it always did.
+    def split_commands(self,line):
+        if len(self.command_separator) == 0 or not self.command_separator in line:
+            return [line]
+        commands = [cmd.strip() for cmd in line.split(self.command_separator) if len(cmd.strip())>0]
+        if len(commands) == 0:
+            return [line]
+        return commands
+
+    # Run a line typed by the player, which can chain several commands together. They're run back to
+    # back as one batch (see handle_many), stopping if one of them ends the game, and a CommandResult
+    # comes back for each one that was run, so the front end can show them all at once.
+    def handle_line(self,line):
+        return self.handle_many(self.split_commands(line))
+
+    # Finish off a half-typed command (for Tab), returning the new line and all the ways it could go on
+    def complete(self,text):
+        with self.lock:
+            if self.completer == None:
+                self.completer = Completer(self)
+            return self.completer.complete_line(text)
+
+    # The canonical form of a command that's been through the lexicon: lowercase, with the verb's own
+    # name in place of an alias (so 'get sword' and 'take sword' are the same command)
+    def canonical(self,words):
+        words = [word.lower() for word in words]
+        if len(words)>0:
+            verb = self.verbs.lookup(words[0])
+            if not verb == None:
+                words[0] = verb.name
+        return ' '.join(words)
+
+    # Suggest what a command that wasn't recognized was meant to be (None if nothing is close)
+    def suggest(self,words):
+        if self.speller == None:
+            self.speller = Speller(self)
+        return self.speller.suggest(words)
+
+    # Run one command, adding it to the list of logged commands if it's a recognized command
+    def run_command(self,msg,logged):
         import re
         buffer = MessageBuffer()        
 
-        # Trim references to 'a piece of'
-        if msg.find('a piece of '):
-            msg = msg.replace('a piece of ','')
-        
-        # Remove references to 'some' 
-        if msg.find('some '):
-            msg = msg.replace('some ','')
-
-        # Strip white space from the front and end of the line
-        msg = msg.strip()        
-
-        # Split the line into a list of commands/tokens
-        cmds = msg.split(' ')
-        
-        # Remove any instances of 'the'
-        if cmds.count('the') > 0:
-            cmds.remove('the')
+        # Split the line into words, dropping words like 'the' and expanding abbreviations (see LEXICON)
+        cmds = self.lexicon.normalize(msg)
+        msg = " ".join(cmds)
 
         # Check to see if command is a Solution for the current room's Puzzle
-        solve = " ".join(cmds).strip()
-        if self.player.current_room.is_solution(solve):
+        solve = self.player.current_room.find_solution(self.canonical(cmds))
+        if not solve == None:
+            self.state_version += 1
             buffer.add(self.player.current_room.check_solution(solve))
             return buffer.send()
 
-        if len(cmds)>0 and cmds[0] in self.commands:
+        if len(cmds)>0 and cmds[0] in self.verbs:
             cmd = cmds.pop(0)
             cmd = cmd.lower()
-            self.add(msg)
-            match cmd:
-                # GENERAL COMMANDS                
-                
-                # Show about message
-                case 'about':
-                    return self.msg_about
-                
-                # Display help message
-                case 'help':     
-                    return self.msg_help  
-                
-                # Display list of available commands
-                case 'commands': 
-                    new_msg = ", ".join(self.commands)
-                    new_msg = 'You can use the following commands: '+new_msg
-                    return new_msg
-                
-                # Display help message if game.player is confused/stuck
-                case 'stuck':
-                    buffer.add(self.msg_stuck)
-                    return buffer.send()
-                
-                # Display hint text for the room if it exists
-                case 'hint':
-                    if 'hint' in vars(self.player.current_room):   # Pulls hints for each room if the room file has one defined
-                        return self.player.current_room.hint
-                
-                 # Display player's current stats (Hit Points, Armor Class, Attack Modifier)
-                case 'stats':
-                    buffer.add("Current Hit Points: "+str(self.player.HP)+"/"+str(self.player.max_HP))
-                    buffer.add("Current Armour Class: "+str(self.player.AC))
-                    buffer.add("Current Attack Modifier: "+str(self.dungeon_items[self.player.weapon].to_hit))
-                    return buffer.send()
+            logged.append(msg)
+            verb = self.verbs.lookup(cmd)
+            if verb.handler == None:
+                return cmd+" handled "
+            if verb.handler.__name__ in self.memo_methods and (len(cmds)==0 or not verb.handler.__name__ == 'verb_look'):
+                result = self.memoized(" ".join([cmd]+cmds),verb,cmd,cmds)
+            else:
+                # Any other command is counted as a change, whether or not it changes anything. That is what keeps
+                # the memo right: lists and dicts changed in place (an item added to a room, say) don't move
+                # the state version on by themselves, and only commands change a game.
+                self.state_version += 1
+                result = verb.handler(cmd,cmds)
+            if not result == None:
+                return result
+        else:
+            suggestion = self.suggest(cmds)
+            if not suggestion == None:
+                return 'ERROR: '+msg+" is not a recognized command. Did you mean '"+suggestion+"'?"
+            return 'ERROR: '+msg+' is not a recognized command'
+        return buffer.send()
 
-                # Display player inventory
-                case 'inventory'|'inv':
-                    buffer.add(self.player.view_inventory())
-                    return buffer.send()
-                
-                # Exit game
-                case 'quit'|'exit': 
-                    return 'quit'
-                
-                # NAVIGATION
-
-                # Show visible exits in this room
-                case 'exits':
-                    msg = ", ".join(self.player.current_room.map.keys())
-                    return 'Exits: '+msg
-
-                # Move player in a given direction
-                case 'go'|'move':                    
-                    newdir = cmds.pop(0)
-                    if newdir in self.directions:
-                        buffer.add(self.player.move(newdir))      
-                    elif newdir == 'to':
-                        destination = " ".join(cmds)
-                        buffer.add("You can't go to "+destination+" from here")
-                    else:
-                        buffer.add("You can't go "+newdir+" from here")
-                    return buffer.send()
-                
-                # Move in the specified direction
-                case 'n'|'s'|'e'|'w'|'north'|'south'|'east'|'west'|'up'|'down':
-                    return self.player.move(cmd) 
-                
-                 # Jump or crouch (not used in this game)
-                case 'jump'|'crouch':
-                    print(f'You try to {cmd}, but nothing happens.')
+    # Run a command that doesn't change anything, reusing its last output if no other command has been
+    # run since (see run_command). Output isn't kept if the command itself changed something (like the
+    # first look in a room, which shows the long description). When the memo is full, the output used
+    # longest ago is dropped.
+    def memoized(self,key,verb,cmd,cmds):
+        entry = self.memo.get(key)
+        if not entry == None and entry[0] == self.state_version:
+            self.memo_hits += 1
+            self.memo.move_to_end(key)
+            return entry[1]
+        self.memo_misses += 1
+        version = self.state_version
+        result = verb.handler(cmd,cmds)
+        if self.state_version == version:
+            self.memo[key] = (version,result)
+            self.memo.move_to_end(key)
+            while len(self.memo) > self.memo_size:
+                self.memo.popitem(last=False)
+        return result
+
+    # VERB HANDLERS - each one gets the command word used and the rest of the words typed after it,
+    #                 and returns the text to show (None for nothing)
+
+    # GENERAL COMMANDS                
+
+    # Show about message
+    def verb_about(self,cmd,cmds):
+        return self.msg_about
+    
+    # Display help message
+    def verb_help(self,cmd,cmds):
+        return self.msg_help  
+    
+    # Display list of available commands
+    def verb_commands(self,cmd,cmds):
+        new_msg = ", ".join(self.verbs.all_words())
+        new_msg = 'You can use the following commands: '+new_msg
+        return new_msg
+    
+    # Display help message if game.player is confused/stuck
+    def verb_stuck(self,cmd,cmds):
+        return self.msg_stuck
+    
+    # Display hint text for the room if it exists
+    def verb_hint(self,cmd,cmds):
+        if self.player.current_room.has_field('hint'):   # Pulls hints for each room if the room file has one defined
+            return self.player.current_room.hint
+    
+    # Display player's current stats (Hit Points, Armor Class, Attack Modifier)
+    def verb_stats(self,cmd,cmds):
+        buffer = MessageBuffer()
+        buffer.add("Current Hit Points: "+str(self.player.HP)+"/"+str(self.player.max_HP))
+        buffer.add("Current Armour Class: "+str(self.player.AC))
+        buffer.add("Current Attack Modifier: "+str(self.dungeon_items[self.player.weapon].to_hit))
+        return buffer.send()
 
+    # Display player inventory
+    def verb_inventory(self,cmd,cmds):
+        return self.player.view_inventory()
+    
+    # Exit game
+    def verb_quit(self,cmd,cmds):
+        return 'quit'
+    
+    # NAVIGATION
+
+    # Show visible exits in this room
+    def verb_exits(self,cmd,cmds):
+        msg = ", ".join(self.player.current_room.map.keys())
+        return 'Exits: '+msg
+
+    # Move player in a given direction
+    def verb_go(self,cmd,cmds):
+        newdir = cmds.pop(0)
+        if newdir in self.directions:
+            return self.player.move(newdir)
+        elif newdir == 'to':
+            destination = " ".join(cmds)
+            return "You can't go to "+destination+" from here"
+        else:
+            return "You can't go "+newdir+" from here"
+    
+    # Move in the specified direction
+    def verb_direction(self,cmd,cmds):
+        return self.player.move(cmd) 
+    
+    # Jump or crouch (not used in this game)
+    def verb_jump(self,cmd,cmds):
+        print(f'You try to {cmd}, but nothing happens.')
 
-                # DIALOG COMMANDS
+    # DIALOG COMMANDS
 
-                # Ask a question to an npc if there's one in the room
-                case 'ask':
-                    if len(cmds)>0:
-                        if cmds[0] in self.player.current_room.npcs:
-                            target = cmds.pop(0)
-                            if target in self.player.current_room.npcs:
-                                if len(cmds)>0:
-                                    topic = " ".join(cmds)
-                                    buffer.add(self.monsters[target].respond(topic))
-                                else:
-                                    buffer.add("What did you want to ask the "+target+"?")
-
-                        elif cmds[0] == 'about':
-                            cmds.pop(0) # Remove 'about'
-                            topic = " ".join(cmds)
-                            if len(self.player.current_room.npcs)>0:                            
-                                for npc in self.player.current_room.npcs:
-                                    buffer.add(self.monsters[npc].respond(topic))
-                            else:
-                                buffer.add("There's no one here to ask about "+topic)
-                        else:
-                            topic = " ".join(cmds)
-                            if len(self.player.current_room.npcs)>0:                            
-                                for npc in self.player.current_room.npcs:
-                                    buffer.add(self.monsters[npc].respond(topic))
-                            else:
-                                buffer.add("There's no one here to ask about "+topic)
-                    else:
-                        buffer.add('You should ask someone about something.')
-                    
-                    return buffer.send()
-                
-                # Say a phrase aloud.
-                case 'say':       
-                    if len(cmds)>0:                    
-                        wrds = " ".join(cmds)
-                        match wrds:
-                            case 'nothing'|'nada':
-                                buffer.add("You hold your tongue. Perhaps now is not the right time to speak?")
-                            case _: 
-                                if len(self.player.current_room.npcs)>0:                    
-                                    buffer.add("You say: '"+wrds.capitalize()+"' ")
-                                    for npc in self.player.current_room.npcs:
-                                        buffer.add(self.monsters[npc].respond(wrds))
-                                else:
-                                    buffer.add("'"+wrds.capitalize()+".' "+self.voices.get_line('echoes'))
-                    else:
-                        buffer.add('What did you want to say?')
-                    
-                    return buffer.send()
-                
-                # Talk to an npc
-                case 'talk':
-                    if len(cmds)>0:                    
-                        if cmds[0] in ['to','with']:
-                            cmds.pop(0)
-                            buffer.add(self.player.talk(cmds))
-                        else:                        
-                            buffer.add(self.player.talk(cmds))
-                    else:
-                        buffer.add('You blather on to yourself, sounding increasingly unhinged.')
-                    
-                    return buffer.send()
-                
-                # Kiss a person or object
-                case 'kiss':        
+    # Ask a question to an npc if there's one in the room
+    def verb_ask(self,cmd,cmds):
+        buffer = MessageBuffer()
+        if len(cmds)>0:
+            if cmds[0] in self.player.current_room.npcs:
+                target = cmds.pop(0)
+                if target in self.player.current_room.npcs:
                     if len(cmds)>0:
-                        thing = " ".join(cmds)
-                        buffer.add('The '+thing+" does not appreciate your romantic overtures.")
+                        topic = " ".join(cmds)
+                        buffer.add(self.monsters[target].respond(topic))
                     else:
-                        buffer.add('Kiss what?')
-                    
-                    return buffer.send()
-                
-                # Attack a person or object
-                case 'attack'|'hit'|'fight'|'kill':
-                    if len(cmds)>0:
-                        target = ' '.join(cmds)
-                        buffer.add(self.attack(target))
-                    elif len(self.player.current_room.npcs)==1:
-                        target = self.player.current_room.npcs[0]
-                        buffer.add(self.attack(target))
+                        buffer.add("What did you want to ask the "+target+"?")
+
+            elif cmds[0] == 'about':
+                cmds.pop(0) # Remove 'about'
+                topic = " ".join(cmds)
+                if len(self.player.current_room.npcs)>0:                            
+                    for npc in self.player.current_room.npcs:
+                        buffer.add(self.monsters[npc].respond(topic))
+                else:
+                    buffer.add("There's no one here to ask about "+topic)
+            else:
+                topic = " ".join(cmds)
+                if len(self.player.current_room.npcs)>0:                            
+                    for npc in self.player.current_room.npcs:
+                        buffer.add(self.monsters[npc].respond(topic))
+                else:
+                    buffer.add("There's no one here to ask about "+topic)
+        else:
+            buffer.add('You should ask someone about something.')
+        
+        return buffer.send()
+    
+    # Say a phrase aloud.
+    def verb_say(self,cmd,cmds):
+        buffer = MessageBuffer()
+        if len(cmds)>0:                    
+            wrds = " ".join(cmds)
+            match wrds:
+                case 'nothing'|'nada':
+                    buffer.add("You hold your tongue. Perhaps now is not the right time to speak?")
+                case _: 
+                    if len(self.player.current_room.npcs)>0:                    
+                        buffer.add("You say: '"+wrds.capitalize()+"' ")
+                        for npc in self.player.current_room.npcs:
+                            buffer.add(self.monsters[npc].respond(wrds))
                     else:
-                        buffer.add('Who or what are you attacking?')
-                    
-                    return buffer.send()
-
-                # Kick a person or object
-                case 'kick':
-                    buffer.add(self.kick(cmds))
-                    return buffer.send()
-                
-                # Punch a person or object
-                case 'punch':
-                    buffer.add(self.punch(cmds))
-                    return buffer.send()
-            
-                # SENSE COMMANDS
-
-                # Look at the item, npc, or room
-                case 'look'|'examine':
-                    buffer.add(self.look(cmds))
-                    return buffer.send()
-                
-
-                # Listen to sounds
-                case 'listen':
-                    buffer.add(self.listen(cmds))
-                    return buffer.send()
-                
-                # Smell the environment
-                case 'smell':
-                    buffer.add(self.smell(cmds))                    
-                    return buffer.send()
-                
-
-                # ROOM/ENVIRONMENT COMMANDS
+                        buffer.add("'"+wrds.capitalize()+".' "+self.voices.get_line('echoes',self.rng))
+        else:
+            buffer.add('What did you want to say?')
+        
+        return buffer.send()
+    
+    # Talk to an npc
+    def verb_talk(self,cmd,cmds):
+        if len(cmds)>0:                    
+            if cmds[0] in ['to','with']:
+                cmds.pop(0)
+            return self.player.talk(cmds)
+        return 'You blather on to yourself, sounding increasingly unhinged.'
+    
+    # Kiss a person or object
+    def verb_kiss(self,cmd,cmds):
+        if len(cmds)>0:
+            thing = " ".join(cmds)
+            return 'The '+thing+" does not appreciate your romantic overtures."
+        return 'Kiss what?'
+    
+    # Attack a person or object
+    def verb_attack(self,cmd,cmds):
+        if len(cmds)>0:
+            target = ' '.join(cmds)
+            return self.attack(target)
+        elif len(self.player.current_room.npcs)==1:
+            target = self.player.current_room.npcs[0]
+            return self.attack(target)
+        return 'Who or what are you attacking?'
 
-                # Search for hidden items and things                       
-                case 'search':
-                    buffer.add(self.search(cmds))
-                    return buffer.send()
-                
-                # PLAYER-ENVIRONMENT COMMANDS
+    # Kick a person or object
+    def verb_kick(self,cmd,cmds):
+        return self.kick(cmds)
+    
+    # Punch a person or object
+    def verb_punch(self,cmd,cmds):
+        return self.punch(cmds)
 
-                # Lights a lightable item (if the player has one)
-                case 'light':       
-                    if len(cmds)>0:
-                        if cmds[0] in self.dungeon_items.keys() and self.player.has_item(cmds[0]) and self.dungeon_items[cmds[0]].isType('lightable'):
-                            buffer.add(self.dungeon_items[cmds[0]].use())
-                        else:
-                            buffer.add("You don't have a light source to light.")
-                    return buffer.send()
-                
-                # Read items or environmental features
-                case 'read':        
-                    if len(cmds)>0:
-                        unavailable_texts = ['newspaper','tombstone','fortune cookie','will','letter','poem']
-                        itm = " ".join(cmds)
-                        if itm in self.dungeon_items.keys():
-                            if self.player.current_room.has_item(itm) or self.player.has_item(itm):
-                                if self.dungeon_items[itm].isType('readable'):                                    
-                                    buffer.add(box_msg(self.dungeon_items[itm].read()))
-                                else:
-                                    buffer.add("There's nothing to read on the "+itm+".")
-                            else:
-                                buffer.add("You don't see "+addArticle(itm)+" here.")
-                        elif 'texts' in vars(self.player.current_room) and itm in self.player.current_room.texts:
-                            buffer.add('You read the '+itm+'.')
-                            buffer.add(box_msg(self.player.current_room.riddle))
-                            
-                        elif itm in unavailable_texts:
-                            buffer.add("You would love to read "+addArticle(itm)+". Sadly you don't have access to one here.")
-                        else:
-                            if re.search(itm,self.player.current_room.long_description) == None and re.search(itm,self.player.current_room.short_description) == None:
-                                buffer.add("There is no "+itm+" around to read.")
-                            else:
-                                buffer.add("There's nothing to read on the "+itm)
-                    else:
-                        buffer.add('What do you wish to read?')
-                    
-                    return buffer.send()
-                
-                # Take or get something 
-                case 'get'|'take':
-                    if len(cmds)>0:                    
-                        phrase = " ".join(cmds)
-                        if not re.search(' from ',phrase)==None:
-                            thing,container = phrase.split(' from ')
-                            buffer.add(self.player.pull_out_item(thing.lower(),container))
-                        else:
-                            buffer.add(self.player.pick_up(phrase.lower()))
-                    else:
-                        buffer.add('Take what?')            
-                    return buffer.send()
-                
-                # Drop or leave something
-                case 'drop'|'leave':
-                    if len(cmds)>0:
-                        thing = " ".join(cmds)     
-                        buffer.add(self.player.drop_item(thing.lower()))
-                    else:
-                        buffer.add('Drop what?')
-                    return buffer.send()
-                
-                # Put or place something into a container
-                case 'put'|'place':
-                    if len(cmds)>0:
-                        phrase = " ".join(cmds)
-                        if not re.search(' in ',phrase)==None:
-                            thing,container = phrase.split(' in ')
-                            buffer.add(self.player.put_item(thing.lower(),container))
-                    return buffer.send()
-                
-                case 'add':
-                    if len(cmds)>0:
-                        phrase = " ".join(cmds)
-                        if not re.search(' to ',phrase)==None:
-                            thing,container = phrase.split(' to ')
-                            buffer.add(self.player.put_item(thing.lower(),container))
-                    return buffer.send()
+    # SENSE COMMANDS
 
-                case 'remove':
-                    if len(cmds)>0:
-                        phrase = " ".join(cmds)
-                        if not re.search(' from ',phrase)==None:
-                            thing,container = phrase.split(' from ')
-                            buffer.add(self.player.pull_out_item(thing.lower(),container))
-                    return buffer.send()
+    # Look at the item, npc, or room
+    def verb_look(self,cmd,cmds):
+        return self.look(cmds)
 
-                # Eat something (if edible)
-                case 'eat':
-                    buffer.add(self.eat(cmds))
-                    return buffer.send()
-                    
+    # Listen to sounds
+    def verb_listen(self,cmd,cmds):
+        return self.listen(cmds)
+    
+    # Smell the environment
+    def verb_smell(self,cmd,cmds):
+        return self.smell(cmds)
 
-                # Drink something (if drinkable)
-                case 'drink':
-                    buffer.add(self.drink(cmds))
-                    return buffer.send()                    
+    # ROOM/ENVIRONMENT COMMANDS
 
-                # Use an item
-                case 'use':
-                    buffer.add(self.use(cmds))
-                    return buffer.send()
+    # Search for hidden items and things                       
+    def verb_search(self,cmd,cmds):
+        return self.search(cmds)
+    
+    # PLAYER-ENVIRONMENT COMMANDS
 
-                # Open a container, door, or corpse
-                case 'open':
-                    buffer.add(self.open(cmds))
-                    return buffer.send()
-                    
-            
-                # Close a container or door
-                case 'close':                
-                    buffer.add(self.close(cmds))
-                    return buffer.send()
-                
-                # Unlock a container or door
-                case 'unlock':
-                    buffer.add(self.unlock(cmds))
-                    return buffer.send()
+    # Lights a lightable item (if the player has one)
+    def verb_light(self,cmd,cmds):
+        if len(cmds)>0:
+            if cmds[0] in self.dungeon_items.keys() and self.player.has_item(cmds[0]) and self.dungeon_items[cmds[0]].isType('lightable'):
+                return self.dungeon_items[cmds[0]].use()
+            return "You don't have a light source to light."
+    
+    # Read items or environmental features
+    def verb_read(self,cmd,cmds):
+        buffer = MessageBuffer()
+        if len(cmds)>0:
+            unavailable_texts = ['newspaper','tombstone','fortune cookie','will','letter','poem']
+            itm = " ".join(cmds)
+            if itm in self.dungeon_items.keys():
+                if self.player.current_room.has_item(itm) or self.player.has_item(itm):
+                    if self.dungeon_items[itm].isType('readable'):                                    
+                        buffer.add(box_msg(self.dungeon_items[itm].read()))
+                    else:
+                        buffer.add("There's nothing to read on the "+itm+".")
+                else:
+                    buffer.add("You don't see "+addArticle(itm)+" here.")
+            elif self.player.current_room.has_field('texts') and itm in self.player.current_room.texts:
+                buffer.add('You read the '+itm+'.')
+                buffer.add(box_msg(self.player.current_room.riddle))
                 
-                # Lock a container or door
-                case 'lock':
-                    buffer.add(self.lock(cmds))
-                    return buffer.send()
-
-                case _:
-                    return cmd+" handled "
+            elif itm in unavailable_texts:
+                buffer.add("You would love to read "+addArticle(itm)+". Sadly you don't have access to one here.")
+            else:
+                if not self.player.current_room.mentions(itm):
+                    buffer.add("There is no "+itm+" around to read.")
+                else:
+                    buffer.add("There's nothing to read on the "+itm)
         else:
-            return 'ERROR: '+msg+' is not a recognized command'
+            buffer.add('What do you wish to read?')
+        
         return buffer.send()
     
-    def print(self,num=40):
-        logsize = len(self.log)        
-        msg = ''
-        start = 0
-        end = logsize
-        
-        if logsize>num:
-            start = logsize-num          
-        for cmd in self.log[start:end]:
-            msg = msg +cmd+"\n"
+    # Take or get something (or several things: 'take sword and key', 'take all from chest')
+    def verb_take(self,cmd,cmds):
+        if len(cmds)>0:                    
+            phrase = " ".join(cmds)
+            if not re.search(' from ',phrase)==None:
+                thing,container = phrase.split(' from ',1)
+                nouns, exceptions = noun_list(thing.lower())
+                if is_many(nouns,exceptions):
+                    return self.player.take_items(nouns,exceptions,container)
+                return self.player.pull_out_item(thing.lower(),container)
+            nouns, exceptions = noun_list(phrase.lower())
+            if is_many(nouns,exceptions):
+                return self.player.take_items(nouns,exceptions)
+            return self.player.pick_up(phrase.lower())
+        return 'Take what?'
+    
+    # Drop or leave something (or several things: 'drop all except lantern')
+    def verb_drop(self,cmd,cmds):
+        if len(cmds)>0:
+            thing = " ".join(cmds)     
+            nouns, exceptions = noun_list(thing.lower())
+            if is_many(nouns,exceptions):
+                return self.player.drop_items(nouns,exceptions)
+            return self.player.drop_item(thing.lower())
+        return 'Drop what?'
+    
+    # Put or place something (or several things: 'put rock, bone in bottle') into a container
+    def verb_put(self,cmd,cmds):
+        if len(cmds)>0:
+            phrase = " ".join(cmds)
+            if not re.search(' in ',phrase)==None:
+                thing,container = phrase.split(' in ',1)
+                return self.put(thing,container)
+    
+    def verb_add(self,cmd,cmds):
+        if len(cmds)>0:
+            phrase = " ".join(cmds)
+            if not re.search(' to ',phrase)==None:
+                thing,container = phrase.split(' to ',1)
+                return self.put(thing,container)
 
-        return msg
+    def verb_remove(self,cmd,cmds):
+        if len(cmds)>0:
+            phrase = " ".join(cmds)
+            if not re.search(' from ',phrase)==None:
+                thing,container = phrase.split(' from ',1)
+                nouns, exceptions = noun_list(thing.lower())
+                if is_many(nouns,exceptions):
+                    return self.player.take_items(nouns,exceptions,container)
+                return self.player.pull_out_item(thing.lower(),container)
+
+    # Put one thing or a list of things into a container
+    def put(self,thing,container):
+        nouns, exceptions = noun_list(thing.lower())
+        if is_many(nouns,exceptions):
+            return self.player.put_items(nouns,exceptions,container)
+        return self.player.put_item(thing.lower(),container)
+
+    # Eat something (if edible)
+    def verb_eat(self,cmd,cmds):
+        return self.eat(cmds)
+
+    # Drink something (if drinkable)
+    def verb_drink(self,cmd,cmds):
+        return self.drink(cmds)
+
+    # Use an item
+    def verb_use(self,cmd,cmds):
+        return self.use(cmds)
+
+    # Open a container, door, or corpse
+    def verb_open(self,cmd,cmds):
+        return self.open(cmds)
+
+    # Close a container or door
+    def verb_close(self,cmd,cmds):
+        return self.close(cmds)
+    
+    # Unlock a container or door
+    def verb_unlock(self,cmd,cmds):
+        return self.unlock(cmds)
+    
+    # Lock a container or door
+    def verb_lock(self,cmd,cmds):
+        return self.lock(cmds)
+    
+    def print(self,num=40):
+        return self.get(num)
     
     def look(self,cmds):        
         buffer = MessageBuffer()
@@ -2169,6 +3494,8 @@ class Console:
             # Handle prepositions
             if nextcmd in ['in','on','at','under','inside']:
                 item = " ".join(cmds)
+                if not self.player.current_room.isNPC(item):
+                    item = self.player.resolve_one(item)
                 if self.player.current_room.isNPC(item):
                     buffer.add(self.monsters[item].describe())
                 elif self.player.current_room.has_item(item):
@@ -2192,7 +3519,7 @@ class Console:
             
             # Look in a particular direction
             elif nextcmd in self.directions:
-                if 'look_'+nextcmd in vars(self.player.current_room):
+                if self.player.current_room.has_field('look_'+nextcmd):
                     match nextcmd:
                         case 'north':
                             buffer.add(self.player.current_room.look_north)
@@ -2218,6 +3545,8 @@ class Console:
             # Look at an NPC, item, room, or corpse
             else:
                 nextcmd = phrase                        
+                if not self.player.current_room.isNPC(nextcmd):
+                    nextcmd = self.player.resolve_one(nextcmd)
                 if self.player.current_room.isNPC(nextcmd):
                     buffer.add(self.monsters[nextcmd].describe())
                 elif self.player.current_room.has_item(nextcmd):
@@ -2252,7 +3581,7 @@ class Console:
                     target = " ".join(cmds)
                     buffer.add("You try listening to the "+target+", but don't hear anything.")
         else:
-            buffer.add('You listen intently. You hear '+self.voices.get_line('sounds')+'.')
+            buffer.add('You listen intently. You hear '+self.voices.get_line('sounds',self.rng)+'.')
         
         return buffer.send()
 
@@ -2261,23 +3590,25 @@ class Console:
         buffer = MessageBuffer()
         if len(cmds)>0:
             target = " ".join(cmds)
+            if not target in self.player.current_room.npcs:
+                target = self.player.resolve_one(target)
             if target in self.player.current_room.npcs:
-                if 'smell_text' in vars(self.monsters[target]):
+                if self.monsters[target].has_field('smell_text'):
                     buffer.add('The '+target+' smells like '+self.monsters[target].smell_text)
                 else:
                     buffer.add("The "+target+" doesn't have a noticeable scent.")
             elif self.player.has_item(target):
-                if 'smell_text' in vars(self.dungeon_items[target]):
+                if self.dungeon_items[target].has_field('smell_text'):
                     buffer.add('The '+target+' smells like '+self.dungeon_items[target].smell_text)
                 else:
                     buffer.add("The "+target+" doesn't have a noticeable scent." )
             elif self.player.current_room.has_item(target):
-                if 'smell_text' in vars(self.dungeon_items[target]):
+                if self.dungeon_items[target].has_field('smell_text'):
                     buffer.add('The '+target+' smells like '+self.dungeon_items[target].smell_text)
                 else:
                     buffer.add("The "+target+" doesn't have a noticeable scent.")
             elif target in ['room','place','cave','cavern']:
-                if 'smell_text' in vars(self.player.current_room):
+                if self.player.current_room.has_field('smell_text'):
                     buffer.add('It smells like '+self.player.current_room.smell_text+' here')
                 else:
                     buffer.add("It smells like most caves. A faint whiff bat guano mingled with damp moss, wet rocks, and a touch of mystery.")
@@ -2285,7 +3616,7 @@ class Console:
                 target = " ".join(cmds)
                 buffer.add('It smells pretty much what you figured '+target+' would smell like.')
         else:
-            if 'smell_text' in vars(self.player.current_room):
+            if self.player.current_room.has_field('smell_text'):
                 buffer.add('It smells like '+self.player.current_room.smell_text+' here')
             else:
                 buffer.add("It smells like most caves. A faint whiff bat guano mingled with damp moss, wet rocks, and a touch of mystery.")
@@ -2332,7 +3663,7 @@ class Console:
         if len(cmds)>0:
             thing = " ".join(cmds)
             if self.player.has_item(thing):
-                if 'drink_text' in vars(self.dungeon_items[thing]):
+                if self.dungeon_items[thing].has_field('drink_text'):
                     buffer.add(self.dungeon_items[thing].drink_text)
                     buffer.add(self.dungeon_items[thing].parse(self.dungeon_items[thing].drink_effect))
                     buffer.add(self.dungeon_items[thing].parse(self.dungeon_items[thing].drink_script))
@@ -2373,7 +3704,8 @@ class Console:
                 else:
                     buffer.add(self.dungeon_items[thing].activate())
             elif self.player.has_possible_matches(thing):
-                buffer.add("Which one? You have multiple "+thing+"s.")
+                plural = thing if thing.endswith('s') else thing+'s'
+                buffer.add("Which one? You have multiple "+plural+".")
             else:
                 buffer.add("You don't have "+addArticle(thing)+".")
             
@@ -2386,7 +3718,7 @@ class Console:
     def open(self,cmds):
         buffer = MessageBuffer()
         if len(cmds)>0:
-            thing = cmds.pop(0)
+            thing = self.player.resolve_one(cmds.pop(0))
             phrase = " ".join(cmds)
             if self.player.has_item(thing) or self.player.current_room.has_item(thing):                       
                 if self.dungeon_items[thing].isKind('container') or self.dungeon_items[thing].isKind('lockbox'):
@@ -2539,7 +3871,7 @@ class Console:
             isLocked = False
 
             # Check if location is one of the valid hidden locations
-            if 'hidden_spots' in vars(self.player.current_room):
+            if self.player.current_room.has_field('hidden_spots'):
                 if self.player.current_room.hidden_state=='not found':
                     if location in self.player.current_room.hidden_spots:
                         buffer.add(self.player.current_room.show())
@@ -2575,7 +3907,7 @@ class Console:
             else:
                 match location:
                     case self.player.current_room: 
-                        if 'hidden' in vars(self.player.current_room) and self.player.current_room.hidden_state=='not found':
+                        if self.player.current_room.has_field('hidden') and self.player.current_room.hidden_state=='not found':
                             buffer.add(self.player.current_room.show())
                             self.player.current_room.hidden_state='found'
                         else:
@@ -2585,7 +3917,7 @@ class Console:
                         if not isContainer or not isLocked:
                             buffer.add("You don't find anything of interest")
         else:
-            if 'hidden' in vars(self.player.current_room) and self.player.current_room.hidden_state=='not found':
+            if self.player.current_room.has_field('hidden') and self.player.current_room.hidden_state=='not found':
                 buffer.add(self.player.current_room.show())
                 self.player.current_room.hidden_state='found'
             else:
@@ -2657,18 +3989,42 @@ class Console:
             buffer.add('Who or what are you trying to punch?')       
         return buffer.send()
 
+    # Switch every loaded object whose data file was edited over to its rebuilt template
+    def apply_reloads(self):
+        if self.template_generation == template_generation:
+            return 0
+        self.template_generation = template_generation
+        switched = 0
+        for registry in [self.dungeon_items,self.dungeon_rooms,self.monsters]:
+            for obj in list(registry.loaded.values()):
+                template = vars(obj).get('template')
+                if template is not None and template.replaced_by is not None:
+                    while template.replaced_by is not None:
+                        template = template.replaced_by
+                    obj.switch_template(template)
+                    switched += 1
+        self.state_version += 1
+        return switched
+
     # Reset Game Environment
     def reset_game_environment(self):
-    # Load Global Lookup Tables (dictionaries) for game.monsters, items, rooms, and sounds/dialog
-        for monster in self.monsters.keys():
-            self.monsters[monster].reset()
-        for room in self.dungeon_rooms.keys():
-            self.dungeon_rooms[room].reset()
-        for item in self.dungeon_items.keys():
-            self.dungeon_items[item].reset()
-        
-        self.player.reset()
-    
-# Create Global Game 
-game = Console()
-game.player.start()
\ No newline at end of file
+    # Only objects looked up during this game can have changed, so only those are put back to their templates
+        with self.lock:
+            self.state_version += 1
+            self.monsters.reset()
+            self.dungeon_rooms.reset()
+            self.dungeon_items.reset()
+            
+            self.player.reset()
+
+            # The new game gets its own transcript, so each one can be replayed on its own
+            self.game_id = new_game_id()
+            self.log.switch_file(self.transcript_file())
+    
+# Create a new game. Any number of games can be played at once; they share the templates built
+# from the data files, but each one has its own world state and random numbers. Only the thread
+# running a command (holding the game's lock) changes a game's objects.
+def new_game(rng=None):
+    game = Console(rng)
+    game.player.start()
+    return game
\ No newline at end of file
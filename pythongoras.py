@@ -94,7 +94,7 @@ def main():
     import time
     pygame.init()
     game_state = 'start_menu'
-    game = pyadv.game
+    game = pyadv.new_game()
          
     #screen = pygame.display.set_mode((WINDOW_WIDTH,WINDOW_HEIGHT),pygame.FULLSCREEN)
     #screen = pygame.display.set_mode((WINDOW_WIDTH,WINDOW_HEIGHT))
@@ -278,27 +278,26 @@ def main():
                             text = text[:-1]
 
                     # Handle return/enter (send command)
+                    # (several commands can be chained on one line; they're all shown in this one frame)
                     elif event.key == pygame.K_RETURN:
-                        match text:
-                            case 'e': text = 'east'
-                            case 'w': text = 'west'
-                            case 's': text = 'south'
-                            case 'n': text = 'north'
-                            case 'u': text = 'up'
-                            case 'd': text = 'down'
-                            case 'inv': text = 'inventory'
-
-                        output = game.handle(text)                             
+                        results = game.handle_line(text)
+                        status = results[-1].status
                                                 
-                        if output == 'quit' or '[END]' in output:
+                        if status in ['quit','end']:
                             game_state = 'game_over'                                       
                         
-                        if output.startswith('[DIED]'):
-                            output = output.replace('[DIED]','')
+                        if status == 'died':
                             game_state = 'player_death'                            
 
-                        output_log.read('\n>> '+text+"\n"+output)
+                        output_log.read(pyadv.transcript(results))
                         text = ''
+
+                    # Handle tab (finish off the command, or list the choices if there's more than one)
+                    elif event.key == pygame.K_TAB:
+                        completed, options = game.complete(text)
+                        if completed == text and len(options)>1:
+                            output_log.read('\n'+', '.join(options))
+                        text = completed
                     else:
                         text += event.unicode
         
@@ -319,9 +318,7 @@ def main():
                     i = 0
                     
                     # Convert output into a paragraph format that fits the output width
-                    lines = get_multiline_from_list(paragraphs,NUM_CHAR)
-
-                    lines = game.get_output(lines,15)
+                    lines = get_last_lines(paragraphs,NUM_CHAR,15)
                     
                     for line in lines:                        
                         if line.startswith('>> '):
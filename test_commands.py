@@ -0,0 +1,44 @@
+# Tests for running commands and chains of commands (python -m pytest test_commands.py)
+import random
+import unittest
+import pyadventure as pyadv
+
+class TestCommandStatus(unittest.TestCase):
+    def test_died_marker_anywhere(self):
+        self.assertEqual(pyadv.command_status('[DIED]You were killed'),'died')
+        self.assertEqual(pyadv.command_status('You attack the skeleton.\n[DIED]You were killed'),'died')
+
+    def test_other_statuses(self):
+        self.assertEqual(pyadv.command_status('quit'),'quit')
+        self.assertEqual(pyadv.command_status('You win [END]'),'end')
+        self.assertEqual(pyadv.command_status('ERROR: xyzzy is not a recognized command'),'error')
+        self.assertEqual(pyadv.command_status('You see a lantern here'),'ok')
+
+    def test_text_drops_marker(self):
+        result = pyadv.CommandResult('attack skeleton','You attack the skeleton.\n[DIED]You were killed')
+        self.assertEqual(result.status,'died')
+        self.assertNotIn('[DIED]',result.text())
+
+class TestCommandChain(unittest.TestCase):
+    # With this seed the skeleton kills the player partway through the attacks
+    def test_chain_stops_when_player_dies(self):
+        game = pyadv.new_game(random.Random(1))
+        line = 'take lantern; w' + '; attack skeleton'*14 + '; look'
+        results = game.handle_line(line)
+        commands = game.split_commands(line)
+        self.assertLess(len(results),len(commands))
+        self.assertEqual(results[-1].command,'attack skeleton')
+        self.assertEqual(results[-1].status,'died')
+        self.assertTrue(all(result.status == 'ok' for result in results[:-1]))
+        self.assertNotIn('[DIED]',pyadv.transcript(results))
+        game.finish()
+
+    def test_chain_runs_every_command(self):
+        game = pyadv.new_game(random.Random(1))
+        results = game.handle_line('take lantern; inventory; look')
+        self.assertEqual([result.command for result in results],['take lantern','inventory','look'])
+        self.assertFalse(any(result.is_over() for result in results))
+        game.finish()
+
+if __name__ == '__main__':
+    unittest.main()
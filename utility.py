@@ -21,14 +21,19 @@ def addArticle(st):
         result = "a "+st
     return result
 
-def roll(diesize=20,modifier=0):
+# rng is the random number generator to use (the random module if it isn't given)
+def roll(diesize=20,modifier=0,rng=None):
     import random    
-    return random.randint(1,diesize)+modifier
+    if rng == None:
+        rng = random
+    return rng.randint(1,diesize)+modifier
 
-def choose(arr):
+def choose(arr,rng=None):
     import random    
+    if rng == None:
+        rng = random
     if not arr == []:
-        return arr[random.randint(0,len(arr))-1]
+        return arr[rng.randint(0,len(arr))-1]
     else:
         return None
 
@@ -82,6 +87,15 @@ def get_multiline_from_list(linelist,width):
         lines = lines + get_multiline_from_str(line,width)
     return lines
 
+# Only the last num lines of get_multiline_from_list (only the paragraphs at the end are wrapped)
+def get_last_lines(linelist,width,num):
+    lines = []
+    for line in reversed(linelist):
+        if len(lines) >= num:
+            break
+        lines = get_multiline_from_str(line,width)+lines
+    return lines[max(0,len(lines)-num):]
+
 def add_padding(width):
     msg =''
     for i in range(width):
@@ -0,0 +1,188 @@
+# World Cache
+#
+# Keeps the parsed fields of every data file in a single binary artifact so
+# that later launches don't have to open and line-parse each file again.
+# Every entry is keyed by the file's relative path and remembers the
+# mtime/size/hash fingerprint of the source it was parsed from. If the world
+# has been packed (see worldpack.py), records are read from the archive
+# (unless the file on disk has been edited since).
+import os
+import io
+import pickle
+import hashlib
+import threading
+import worldpack
+
+ASSETS_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_FILE = os.path.join(ASSETS_DIR,'world.cache')
+CACHE_VERSION = 2
+
+# Copy a fields dictionary so that entities never share lists or dicts with the cache
+def copy_fields(fields):
+    result = {}
+    for key, value in fields.items():
+        if isinstance(value,(list,dict)):
+            value = value.copy()
+        result[key] = value
+    return result
+
+# Compute the fingerprint (mtime, size) of a data file
+def stat_file(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+# Get the current fingerprint of a data file (or its record in the world archive)
+def get_fingerprint(name,path):
+    if worldpack.packed(name,path):
+        return worldpack.world_archive.fingerprint(name)
+    return stat_file(path)
+
+# Parsers for each kind of data file, registered by name so that worker processes can look them up
+PARSERS = {}
+
+def register_parser(kind,parser):
+    PARSERS[kind] = parser
+
+# Read and parse a data file without touching the cache, returning (fingerprint, digest, fields).
+# This is the unit of work the parallel loader hands out to its workers.
+def parse_file(name,path,kind):
+    parser = PARSERS[kind]
+    if worldpack.packed(name,path):
+        archive = worldpack.world_archive
+        fingerprint = archive.fingerprint(name)
+        return fingerprint, fingerprint[2], parser(archive.read_lines(name))
+    fingerprint = stat_file(path)
+    with open(path,'rb') as f:
+        data = f.read()
+    return fingerprint, hashlib.sha1(data).hexdigest(), parser(io.TextIOWrapper(io.BytesIO(data)))
+
+class WorldCache:
+    def __init__(self,filename=CACHE_FILE):
+        self.filename = filename
+        self.entries = {}           # relative path -> (fingerprint, digest, fields)
+        self.paths = {}             # relative path -> where the file was last looked for (not saved)
+        self.changed = False
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.RLock()   # held while entries are looked up or changed (prefetch threads share the cache)
+        self.save_lock = threading.Lock()   # held while the cache is written, so two saves can't interleave
+        self.load()
+
+    # Load the compiled cache from disk. A missing, corrupt, or outdated cache just starts empty.
+    def load(self):
+        try:
+            with open(self.filename,'rb') as f:
+                version, entries = pickle.load(f)
+            if version == CACHE_VERSION:
+                self.entries = entries
+        except:
+            self.entries = {}
+
+    # Write the cache back to disk if anything was re-parsed since it was loaded. A snapshot of the
+    # entries is written, so other threads can keep adding to the cache while it's being saved.
+    def save(self):
+        with self.save_lock:
+            self.write()
+
+    def write(self):
+        with self.lock:
+            if not self.changed:
+                return
+            entries = dict(self.entries)
+            self.changed = False
+
+        # Leave out the entries for data files that have been deleted
+        missing = [name for name in entries if not self.exists(name)]
+        for name in missing:
+            del entries[name]
+        if len(missing)>0:
+            with self.lock:
+                for name in missing:
+                    self.entries.pop(name,None)
+        try:
+            tmpname = f'{self.filename}.{os.getpid()}.tmp'     # one per process (forked game workers save too)
+            with open(tmpname,'wb') as f:
+                pickle.dump((CACHE_VERSION,entries),f,pickle.HIGHEST_PROTOCOL)
+            os.replace(tmpname,self.filename)
+        except OSError:
+            print(f'Cache write error: could not write {self.filename}')
+            with self.lock:
+                self.changed = True
+
+    # Check if a cached data file still exists (on disk or in the world archive)
+    def exists(self,name):
+        archive = worldpack.world_archive
+        if archive is not None and name in archive:
+            return True
+        return os.path.exists(self.paths.get(name,os.path.join(ASSETS_DIR,name)))
+
+    # Return the parsed fields for a data file. The parser (which takes an iterable of
+    # lines) only runs if the file's fingerprint no longer matches the cached entry.
+    def read(self,name,path,parser):
+        if worldpack.packed(name,path):
+            return self.read_record(name,worldpack.world_archive,parser)
+
+        fingerprint = stat_file(path)
+        with self.lock:
+            self.paths[name] = path
+            entry = self.entries.get(name)
+            if entry is not None and entry[0] == fingerprint:
+                self.hits += 1
+                return copy_fields(entry[2])
+
+        with open(path,'rb') as f:
+            data = f.read()
+        digest = hashlib.sha1(data).hexdigest()
+        touched = entry is not None and entry[1] == digest
+        if touched:
+            # Touched but not edited, so keep the parsed fields and refresh the fingerprint
+            fields = entry[2]
+        else:
+            fields = parser(io.TextIOWrapper(io.BytesIO(data)))
+        with self.lock:
+            if touched:
+                self.hits += 1
+            else:
+                self.misses += 1
+            self.entries[name] = (fingerprint,digest,fields)
+            self.changed = True
+        return copy_fields(fields)
+
+    # Same as read, but for a record in the world archive (whose index already holds a checksum)
+    def read_record(self,name,archive,parser):
+        fingerprint = archive.fingerprint(name)
+        with self.lock:
+            entry = self.entries.get(name)
+            if entry is not None and entry[0] == fingerprint:
+                self.hits += 1
+                return copy_fields(entry[2])
+
+        fields = parser(archive.read_lines(name))
+        with self.lock:
+            self.misses += 1
+            self.entries[name] = (fingerprint,fingerprint[2],fields)
+            self.changed = True
+        return copy_fields(fields)
+
+    # Check if a data file needs to be parsed again
+    def is_stale(self,name,path):
+        with self.lock:
+            self.paths[name] = path
+            entry = self.entries.get(name)
+        return entry is None or not entry[0] == get_fingerprint(name,path)
+
+    # Store the result of parse_file for a data file
+    def store(self,name,fingerprint,digest,fields):
+        with self.lock:
+            self.misses += 1
+            self.entries[name] = (fingerprint,digest,fields)
+            self.changed = True
+
+    # Forget every cached entry (the next load re-parses everything)
+    def clear(self):
+        with self.lock:
+            self.entries = {}
+            self.changed = True
+
+# Global cache shared by every loader
+world_cache = WorldCache()
@@ -0,0 +1,124 @@
+# World Check
+#
+# Static checks for the world's data files, run after the world has been
+# loaded (and before every content build). Every object script is compiled and
+# checked for fields and objects that don't exist, and every reference
+# from one object to another (exits, items, doors, corpses, keys, piles, and
+# 'run' targets) has to name something that exists. All the problems are
+# reported together, instead of one at a time whenever a player trips over them.
+#
+#   python worldcheck.py        - check the world (exits with status 1 if there are problems)
+import sys
+import pyadventure as pyadv
+
+# Fields that list the names of other objects: (kind of object, field, kind of object it refers to)
+REFERENCES = [
+    ('room','items','item'),
+    ('room','npcs','monster'),
+    ('room','doors','item'),
+    ('item','contents','item'),
+    ('item','unlock_key','item'),
+    ('item','pile','item'),
+    ('monster','corpse','item'),
+    ('monster','item','item'),
+    ('monster','treasure','item'),
+]
+
+# Turn a field value into a list of names (skipping blanks)
+def names_in(value):
+    if isinstance(value,str):
+        value = [value]
+    return [name.strip().replace('_',' ') for name in value if len(name.strip())>0]
+
+# Build the template of every object in the game's registries (without running into the game's
+# lookups), returning {kind: {name: template}} along with the files that couldn't be read
+def load_templates(console,problems):
+    world = {}
+    for kind, registry in [('room',console.dungeon_rooms),('item',console.dungeon_items),('monster',console.monsters)]:
+        world[kind] = {}
+        for name, cls in registry.classes.items():
+            filename = cls.data_file(name)
+            try:
+                pyadv.world_cache.read(filename,pyadv.resource_path(filename),cls.read_fields)
+            except Exception:
+                problems.append(f'{filename}: missing or unreadable')
+                continue
+            world[kind][name] = pyadv.get_template(cls,name,False)
+    return world
+
+# Find the object a 'run' instruction refers to (in the same order the game looks it up)
+def find_object(world,name):
+    for kind in ['monster','room','item']:
+        if name in world[kind]:
+            return kind, world[kind][name]
+    return None, None
+
+# Check one object's scripts, adding any problems to the list
+def check_scripts(world,kind,template,problems):
+    filename = template.cls.data_file(template.name)
+    for key, value in template.fields.items():
+        if not pyadv.is_script_field(key) or not isinstance(value,str):
+            continue
+        script = pyadv.compile_script(value)
+        for error in script.errors:
+            problems.append(f'{filename}: {key}: {error}')
+        for code in script.code:
+            op = code[0]
+            if op in ['bad','unknown']:
+                continue
+            if op == 'set' and code[2] == 'field' and not code[3] in template.fields:
+                problems.append(f"{filename}: {key}: no field '{code[3]}' to set {code[1]} to")
+            elif op == 'print' and not code[1] in template.fields:
+                problems.append(f"{filename}: {key}: no field '{code[1]}' to print")
+            elif op == 'open' and not code[1] == None:
+                if not code[1] in world['item']:
+                    problems.append(f"{filename}: {key}: no item '{code[1]}' to open")
+                elif not world['item'][code[1]].fields.get('kind') in ['container','lockbox']:
+                    problems.append(f"{filename}: {key}: '{code[1]}' can't be opened")
+            elif op == 'run' and not code[1] == 'room':
+                target_kind, target = find_object(world,code[1])
+                if target == None:
+                    problems.append(f"{filename}: {key}: nothing called '{code[1]}' to run")
+                elif not code[2] in target.fields:
+                    problems.append(f"{filename}: {key}: '{code[1]}' has no script '{code[2]}'")
+
+# Check every reference from one object to another, adding any problems to the list
+def check_references(world,kind,template,problems):
+    filename = template.cls.data_file(template.name)
+    fields = template.fields
+    for ref_kind, field, target_kind in REFERENCES:
+        if ref_kind == kind and field in fields:
+            for name in names_in(fields[field]):
+                if not name in world[target_kind]:
+                    problems.append(f"{filename}: {field}: no {target_kind} called '{name}'")
+
+    if kind == 'room':
+        for direction, room in fields.get('map',{}).items():
+            if not room in world['room']:
+                problems.append(f"{filename}: map: exit {direction} leads to unknown room '{room}'")
+        for text in names_in(fields.get('texts',[])):
+            if not text in fields:
+                problems.append(f"{filename}: texts: no field '{text}' to read")
+        if 'on_take' in fields:
+            for name in names_in(fields['on_take']):
+                if not 'on_take_'+name in fields:
+                    problems.append(f"{filename}: on_take: no on_take_{name} script")
+
+# Check the whole world loaded by a console, returning a list of problems (empty if everything is fine)
+def check_world(console):
+    problems = []
+    world = load_templates(console,problems)
+    for kind, templates in world.items():
+        for name, template in templates.items():
+            check_scripts(world,kind,template,problems)
+            check_references(world,kind,template,problems)
+    return problems
+
+if __name__ == "__main__":
+    game = pyadv.new_game()
+    problems = check_world(game)
+    for problem in problems:
+        print(problem)
+    num_objects = len(game.dungeon_rooms)+len(game.dungeon_items)+len(game.monsters)
+    print(f'Checked {num_objects} objects: {len(problems)} problems found')
+    sys.exit(1 if len(problems)>0 else 0)
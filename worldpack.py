@@ -0,0 +1,173 @@
+# World Pack
+#
+# Packs every file in the data folder into a single archive (world.pak) so a
+# build only has to ship one file. Records are sliced out of a memory-mapped
+# view of the archive instead of each file being opened, then decoded into
+# text for the parser. A data file edited since the world was packed is read
+# from disk instead of the archive, so packing never hides an edit.
+#
+#   python worldpack.py pack [archive]       - build the archive from the data folder
+#   python worldpack.py unpack [archive]     - write the archive back out as plain text files
+#   python worldpack.py list [archive]       - list the records in the archive
+#
+# Layout: header (magic, index offset, index length), the records one after
+# another, then a JSON index of name -> [offset, length, crc32].
+import os
+import io
+import sys
+import mmap
+import json
+import zlib
+import struct
+
+ASSETS_DIR = os.path.dirname(os.path.abspath(__file__))
+PACK_FILE = os.path.join(ASSETS_DIR,'world.pak')
+PACK_MAGIC = b'PYWORLD1'
+HEADER = struct.Struct('<8sQQ')
+
+# Archive record names always use '/' so they match on every platform
+def record_name(relative_path):
+    return relative_path.replace('\\','/')
+
+class WorldArchive:
+    def __init__(self,filename=PACK_FILE):
+        self.filename = filename
+        self.file = open(filename,'rb')
+        self.data = mmap.mmap(self.file.fileno(),0,access=mmap.ACCESS_READ)
+        magic, offset, length = HEADER.unpack_from(self.data,0)
+        if not magic == PACK_MAGIC:
+            self.close()
+            raise ValueError(f'{filename} is not a world archive')
+        self.index = json.loads(self.data[offset:offset+length])
+        self.view = memoryview(self.data)
+        self.mtime = os.fstat(self.file.fileno()).st_mtime_ns
+
+    def __contains__(self,name):
+        return record_name(name) in self.index
+
+    # List the names of every record in the archive
+    def names(self):
+        return list(self.index.keys())
+
+    # Return a slice of the archive holding the record (a view of the mapped file, not a copy)
+    def record(self,name):
+        offset, length, crc = self.index[record_name(name)]
+        return self.view[offset:offset+length]
+
+    # Return a fingerprint for the record that changes whenever its contents do
+    def fingerprint(self,name):
+        offset, length, crc = self.index[record_name(name)]
+        return ('pak',length,crc)
+
+    # Return the record as an iterable of lines (like an open text file). This decodes a copy of it.
+    def read_lines(self,name):
+        return io.StringIO(str(self.record(name),'utf-8'))
+
+    def close(self):
+        if hasattr(self,'view'):
+            self.view.release()
+        self.data.close()
+        self.file.close()
+
+# Open the world archive if one has been packed, otherwise return None
+def open_archive(filename=PACK_FILE):
+    if os.path.exists(filename):
+        try:
+            return WorldArchive(filename)
+        except (OSError,ValueError):
+            print(f'Archive read error: {filename} could not be opened')
+    return None
+
+# Data files on disk that are newer than the archive: name -> (mtime and size, whether it differs from its record)
+loose_files = {}
+
+# Check if a data file should be read from the world archive. A copy on disk that is newer than the
+# archive and no longer matches its record (it was edited after packing) is read instead, with a note
+# the first time.
+def packed(name,path):
+    archive = world_archive
+    if archive is None or not name in archive:
+        return False
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return True
+    if stat.st_mtime_ns <= archive.mtime:
+        return True
+    fingerprint = (stat.st_mtime_ns,stat.st_size)
+    known = loose_files.get(name)
+    if known is None or not known[0] == fingerprint:
+        with open(path,'rb') as f:
+            data = f.read().replace(b'\r\n',b'\n')
+        edited = not zlib.crc32(data) == archive.index[record_name(name)][2]
+        if edited and (known is None or not known[1]):
+            print(f'Archive note: {name} was edited after {os.path.basename(archive.filename)} was packed, so it is read from disk (run "python worldpack.py pack" to update the archive)')
+        known = (fingerprint,edited)
+        loose_files[name] = known
+    return not known[1]
+
+# Read the lines of a data file from the world archive or, if it isn't packed (or was edited since), from disk
+def read_lines(name,path):
+    if packed(name,path):
+        return world_archive.read_lines(name)
+    return open(path,'r')
+
+# Pack every text file under the data folder into a single archive
+def pack(filename=PACK_FILE,root=ASSETS_DIR):
+    records = []
+    for folder, dirs, files in os.walk(os.path.join(root,'data')):
+        dirs.sort()
+        for file in sorted(files):
+            if file.endswith('.txt'):
+                path = os.path.join(folder,file)
+                records.append((record_name(os.path.relpath(path,root)),path))
+
+    index = {}
+    with open(filename,'wb') as f:
+        f.write(HEADER.pack(PACK_MAGIC,0,0))
+        for name, path in records:
+            with open(path,'rb') as src:
+                data = src.read().replace(b'\r\n',b'\n')
+            index[name] = [f.tell(),len(data),zlib.crc32(data)]
+            f.write(data)
+        offset = f.tell()
+        table = json.dumps(index).encode()
+        f.write(table)
+        f.seek(0)
+        f.write(HEADER.pack(PACK_MAGIC,offset,len(table)))
+    return len(records)
+
+# Write every record in an archive back out as a plain text file
+def unpack(filename=PACK_FILE,root=ASSETS_DIR):
+    archive = WorldArchive(filename)
+    names = archive.names()
+    for name in names:
+        path = os.path.join(root,*name.split('/'))
+        os.makedirs(os.path.dirname(path),exist_ok=True)
+        with open(path,'w') as f:
+            f.write(str(archive.record(name),'utf-8'))
+    archive.close()
+    return len(names)
+
+# Global archive shared by every loader (None if the world hasn't been packed)
+world_archive = open_archive()
+
+if __name__ == "__main__":
+    if world_archive is not None:
+        world_archive.close()       # don't hold the archive open while rewriting it
+    args = sys.argv[1:]
+    cmd = args[0] if len(args)>0 else 'list'
+    filename = args[1] if len(args)>1 else PACK_FILE
+    match cmd:
+        case 'pack':
+            print(f'Packed {pack(filename)} records into {filename}')
+        case 'unpack':
+            print(f'Unpacked {unpack(filename)} records from {filename}')
+        case 'list':
+            archive = WorldArchive(filename)
+            for name in archive.names():
+                offset, length, crc = archive.index[name]
+                print(f'{offset:>10} {length:>8}  {name}')
+            archive.close()
+        case _:
+            print('Usage: python worldpack.py pack|unpack|list [archive]')
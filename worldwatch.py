@@ -0,0 +1,52 @@
+# World Watcher
+#
+# Polls for edited data files on a background thread so the world can be
+# changed while the game is running. It doesn't need any extra packages: it
+# just calls a check function on a timer. Each time nothing has changed the
+# delay before the next poll doubles (up to max_delay), and as soon as
+# something does change it drops back to min_delay.
+import threading
+
+class Watcher:
+    def __init__(self,check,min_delay=0.5,max_delay=8.0):
+        self.check = check              # callable that returns how many things changed
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.delay = min_delay
+        self.polls = 0
+        self.changes = 0
+        self.stopped = threading.Event()
+        self.thread = None
+
+    # Start polling (does nothing if the watcher is already running)
+    def start(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.stopped.clear()
+            self.thread = threading.Thread(target=self.run,daemon=True)
+            self.thread.start()
+
+    # Stop polling and wait for the current poll to finish
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    # Run a single poll and work out how long to wait before the next one
+    def poll(self):
+        try:
+            changed = self.check()
+        except Exception as e:
+            print(f'Watcher error: {e}')
+            changed = 0
+        self.polls += 1
+        if changed:
+            self.changes += changed
+            self.delay = self.min_delay
+        else:
+            self.delay = min(self.delay*2,self.max_delay)
+        return changed
+
+    def run(self):
+        while not self.stopped.wait(self.delay):
+            self.poll()